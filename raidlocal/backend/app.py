@@ -1,15 +1,27 @@
 # backend/app.py
-from fastapi import FastAPI, HTTPException, Body
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, HTTPException, Body, Request
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
 from typing import List, Optional
-from .item_parser import router as items_router
+import os
+from .item_parser import router as items_router, close_clients as close_item_clients
 
-from backend.queue_utils import get_queue
-from backend import simc_runner
+from backend.queue_utils import get_queue, get_redis, job_status as read_job_status, job_statuses
+from backend import simc_runner, result_cache, progress, artifacts, result_view, gear_combos, scheduling, metrics, nodes
 
-app = FastAPI(title="RaidLocal", version="0.1.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # per-loop clients of the item metadata lookups
+    await close_item_clients()
+
+app = FastAPI(title="RaidLocal", version="0.1.0", lifespan=lifespan)
+
+# Default number of worker shards for trinket-pair runs (1 = single job)
+PAIR_SHARDS = int(os.environ.get("SIMC_PAIR_SHARDS", "1"))
 
 # serve frontend assets
 app.mount("/frontend", StaticFiles(directory="frontend"), name="frontend")
@@ -17,6 +29,8 @@ app.mount("/frontend", StaticFiles(directory="frontend"), name="frontend")
 class QuickSimRequest(BaseModel):
     simc_input: str
     extra_args: Optional[List[str]] = None
+    no_cache: bool = False
+    dry_run: bool = False                 # only estimate, don't enqueue
 
 class ProfilesetDef(BaseModel):
     name: str
@@ -26,6 +40,8 @@ class ProfilesetRequest(BaseModel):
     base_profile: str
     profilesets: List[ProfilesetDef]
     extra_args: Optional[List[str]] = None
+    no_cache: bool = False
+    dry_run: bool = False
 
 class TrinketItem(BaseModel):
     name: str
@@ -35,39 +51,273 @@ class TrinketPairsRequest(BaseModel):
     base_profile: str
     items: List[TrinketItem]
     extra_args: Optional[List[str]] = None
+    shards: Optional[int] = None
+    no_cache: bool = False
+    dry_run: bool = False
+    staged: bool = False
+    stage_margin: float = 1.0          # % of the leader's DPS kept for stage two
+    stage_target_error: float = 1.0    # SimC target_error for stage one
+
+class GearCombosRequest(BaseModel):
+    base_profile: str
+    slots: Optional[List[str]] = None     # slot groups to vary (default: all)
+    items: Optional[List[str]] = None     # picked bag overrides; None = whole bag
+    tier_ids: List[int] = []
+    min_tier: int = 0
+    unique_ids: List[int] = []
+    max_changes: Optional[int] = None     # slot groups that may differ from equipped
+    max_combos: Optional[int] = None      # capped at SIMC_MAX_COMBOS
+    dry_run: bool = False                 # only count the combinations and estimate
+    extra_args: Optional[List[str]] = None
+    shards: Optional[int] = None
+    no_cache: bool = False
+    staged: bool = False
+    stage_margin: float = 1.0
+    stage_target_error: float = 1.0
 
 class ParseTrinketsAllRequest(BaseModel):
     simc_input: str
     include_equipped: bool = True
 
+class BatchMember(BaseModel):
+    label: Optional[str] = None  # e.g. the character name
+    quick_sim: Optional[QuickSimRequest] = None
+    top_gear: Optional[ProfilesetRequest] = None
+    trinket_pairs: Optional[TrinketPairsRequest] = None
+    gear_combos: Optional[GearCombosRequest] = None
+
+class BatchRequest(BaseModel):
+    members: List[BatchMember]
+    extra_args: Optional[List[str]] = None  # used by members that don't set their own
+
+MAX_BATCH_MEMBERS = 100
+BATCH_TTL = 60 * 60 * 24
+# set while a batch submits its members: their results must outlive RQ's default
+# result_ttl (500s), or early finishers are gone before the batch is read
+_result_ttl: ContextVar[Optional[int]] = ContextVar("raidlocal_result_ttl", default=None)
+
 @app.get("/", response_class=HTMLResponse)
 def root():
     with open("frontend/index.html","r",encoding="utf-8") as f:
         return HTMLResponse(f.read())
 
 @app.get("/healthz")
-def healthz(): return {"status": "ok"}
+def healthz():
+    try:
+        redis_ok = bool(get_redis().ping())
+    except Exception:
+        redis_ok = False
+    return {"status": "ok", "redis": redis_ok}
+
+@app.get("/api/nodes")
+def list_nodes():
+    """Live sim nodes with their cores and simc build; `simc_matches` compares it with the API's build (cache keys)."""
+    version = simc_runner.simc_version()
+    return {"simc": version, "nodes": [{**n, "simc_matches": n["simc"] == version} for n in nodes.summary()]}
+
+@app.get("/api/queue")
+def queue_status(request: Request):
+    """Outstanding work and the start ETA of a new job per queue, plus what the caller has outstanding."""
+    return scheduling.queue_state(scheduling.user_id(request))
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Prometheus scrape endpoint: stage timings, cache hit rates, queue depth, workers and cores."""
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
+def _cached_job(key: str, no_cache: bool) -> Optional[str]:
+    """Job id of an already finished identical run, or None if it must be simmed."""
+    if no_cache or not result_cache.touch(key):
+        return None
+    return result_cache.CACHED_JOB_PREFIX + key
+
+def _plan(sim_text: str, extra_args: Optional[List[str]], user: Optional[str], profilesets: Optional[int] = None) -> dict:
+    try:
+        return scheduling.plan(sim_text, extra_args, user, profilesets)
+    except scheduling.UserLimitError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+def _admit(sim_text: str, extra_args: Optional[List[str]], profilesets: Optional[int] = None, remaining=None):
+    """(extra_args to run with, note on lowered precision) under the configured budgets."""
+    try:
+        return scheduling.admit(sim_text, extra_args, profilesets, remaining)
+    except scheduling.BudgetError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _job_opts() -> dict:
+    """Extra enqueue options for the job a submission hands out (see _result_ttl)."""
+    ttl = _result_ttl.get()
+    return {"result_ttl": ttl} if ttl else {}
+
+def _downgraded(note: Optional[str]) -> dict:
+    return {"downgraded": note} if note else {}
 
 @app.post("/api/quick-sim")
-def quick_sim(req: QuickSimRequest):
-    job = get_queue().enqueue(simc_runner.run_simc_from_text, req.simc_input, req.extra_args or [])
-    return {"job_id": job.id}
+def quick_sim(req: QuickSimRequest, request: Request):
+    extra_args, note = _admit(req.simc_input, req.extra_args, 0)
+    key = simc_runner.result_cache_key(req.simc_input, extra_args)
+    cached = _cached_job(key, req.no_cache)
+    if cached:
+        return {"cached": True} if req.dry_run else {"job_id": cached, "cached": True}
+    user = scheduling.user_id(request)
+    plan = _plan(req.simc_input, extra_args, user, 0)
+    estimate = scheduling.estimate(plan)
+    if req.dry_run:
+        return {"queue": plan["queue"], "estimate": estimate, **_downgraded(note)}
+    q = get_queue(plan["queue"])
+    job = q.enqueue(simc_runner.run_simc_from_text, req.simc_input, extra_args, key,
+                    job_timeout=plan["timeout"], **_job_opts())
+    scheduling.place(q, [job.id], plan["turn"])
+    scheduling.track(user, job.id, estimate, plan["turn"])
+    return {"job_id": job.id, "queue": plan["queue"], "estimate": estimate, **_downgraded(note)}
+
+def _enqueue_run(plan: dict, sim_text: str, extra_args: Optional[List[str]], shards: int = 1,
+                 cache_key: Optional[str] = None, memo: Optional[dict] = None,
+                 meta: Optional[dict] = None, job_id: Optional[str] = None, events_to: Optional[str] = None):
+    """
+    Enqueue one profileset run on the queue picked by `plan` (scheduling.plan),
+    split across `shards` worker jobs when asked. Returns (job to watch, shard job ids).
+    """
+    import uuid
+    from rq.job import Dependency
+    q = get_queue(plan["queue"])
+    meta = {**(meta or {}), **({"events_to": events_to} if events_to else {})}
+    # what the API spent on this submission (profileset generation, item lookups)
+    meta["timings"] = metrics.rounded(metrics.current() or {})
+    chunks = simc_runner.split_profilesets(sim_text, shards)
+    if len(chunks) == 1:
+        job = q.enqueue(simc_runner.run_profileset_job, sim_text, extra_args or [], cache_key, memo,
+                        job_id=job_id, meta=meta, job_timeout=plan["timeout"], **_job_opts())
+        scheduling.place(q, [job.id], plan["turn"])
+        return job, []
+    # Fan out: one child job per chunk, then a finalizer that merges them.
+    # Children report progress on the finalizer's event channel.
+    job_id = job_id or str(uuid.uuid4())
+    child_timeout = scheduling.timeout_for(plan["cost"] / len(chunks))
+    children = [q.enqueue(simc_runner.run_simc_from_text, c, extra_args or [],
+                          meta={"events_to": events_to or job_id, "shard": i},
+                          job_timeout=child_timeout)
+                for i, c in enumerate(chunks)]
+    scheduling.place(q, [c.id for c in children], plan["turn"])
+    job = q.enqueue(
+        simc_runner.finalize_sharded_run, [c.id for c in children], cache_key, memo,
+        job_id=job_id, meta=meta, job_timeout=scheduling.FINALIZE_TIMEOUT,
+        depends_on=Dependency(jobs=children, allow_failure=True, enqueue_at_front=True), **_job_opts(),
+    )
+    return job, [c.id for c in children]
+
+def _enqueue_profilesets(base_profile: str, profiles: List[dict], extra_args: Optional[List[str]],
+                         no_cache: bool = False, shards: Optional[int] = None, staged: Optional[dict] = None,
+                         user: Optional[str] = None, default_shards: int = 1, dry_run: bool = False) -> dict:
+    """
+    Enqueue a profileset run. Whole-run cache hits return immediately; otherwise
+    only the profilesets not already memoized for this base + settings are
+    simmed (split across `shards` worker jobs; by default across the live sim
+    nodes for big runs, see nodes.auto_shards) and the memoized rows are merged
+    back in when the run finishes. Every run of the same base + settings
+    reports the same (first simmed) baseline, so deltas of memoized, sharded
+    and new rows are all against one number. The queue and timeout follow the
+    estimated cost of what is left to sim.
+
+    staged: {"margin": pct, "target_error": pct} runs every profileset at
+    `target_error` first and only re-sims the ones within `margin` % of the
+    leader at the requested precision.
+
+    Precision over the configured budgets is lowered first (scheduling.admit),
+    counting only the profilesets that aren't memoized yet.
+    Responses carry the runtime estimate; `dry_run` only returns it with the
+    memoized/todo counts, and never a job id.
+    """
+    fields = {simc_runner.profileset_name(p): result_cache.profileset_field(p["overrides"])
+              for p in profiles if p.get("overrides")}
+    lookups = {}
+
+    def lookup(args: List[str]):
+        """Memo hits of this base under `args`: (memo key, baseline, {name: row})."""
+        k = tuple(args)
+        if k not in lookups:
+            memo_key = simc_runner.result_cache_key(base_profile, args)
+            lookups[k] = (memo_key, *((None, {}) if no_cache else result_cache.memo_lookup(memo_key, fields)))
+        return lookups[k]
+
+    # only what isn't memoized yet counts against the budget
+    extra_args, note = _admit(base_profile, extra_args, len(profiles),
+                              lambda args: len(profiles) - len(lookup(args)[2]))
+    sim_text = simc_runner.generate_profilesets(base_profile, profiles)
+    key_args = list(extra_args or [])
+    if staged:
+        # staged results differ from a full run, so they get their own cache entry
+        key_args.append(f"raidlocal_staged={staged['margin']:g}/{staged['target_error']:g}")
+    key = simc_runner.result_cache_key(sim_text, key_args)
+    cached = _cached_job(key, no_cache)
+    if cached:
+        return {"cached": True} if dry_run else {"job_id": cached, "cached": True}
+
+    memo_key, baseline, hits = lookup(extra_args)
+    memo = {
+        "key": memo_key,
+        "fields": fields,
+        # a forced re-sim also replaces the baseline later runs of this base share
+        "fresh": no_cache,
+        "cached": list(hits.values()),
+    }
+    todo = [p for p in profiles if simc_runner.profileset_name(p) not in hits]
+    if baseline is not None and not todo:
+        if dry_run:  # nothing is written, so there is no job to hand out
+            return {"cached": True, "memoized": len(hits), "todo": 0}
+        simc_runner.finish_profileset_run({"json": baseline, "stdout": ""}, key, memo)
+        return {"job_id": result_cache.CACHED_JOB_PREFIX + key, "cached": True, "memoized": len(hits)}
+
+    todo_text = simc_runner.generate_profilesets(base_profile, todo)
+    # memoized rows are streamed to the browser as soon as it subscribes
+    meta = {"rows": progress.compact_rows([{**r, "cached": True} for r in memo["cached"]])}
+    plan = _plan(todo_text, extra_args, user, len(todo))
+    shards = shards or max(default_shards, nodes.auto_shards(len(todo), plan["queue"]))
+    shards = max(1, min(shards, len(todo)))
+    if not staged:
+        estimate = scheduling.estimate(plan, shards)
+        if dry_run:
+            return {"memoized": len(hits), "todo": len(todo), "queue": plan["queue"], "estimate": estimate,
+                    **_downgraded(note)}
+        job, shard_ids = _enqueue_run(plan, todo_text, extra_args, shards, key, memo, meta)
+        scheduling.track(user, job.id, estimate, plan["turn"])
+        return {"job_id": job.id, "memoized": len(hits), "shard_job_ids": shard_ids, "queue": plan["queue"],
+                "estimate": estimate, **_downgraded(note)}
+
+    import uuid
+    from rq.job import Dependency
+    job_id = str(uuid.uuid4())
+    first_args = simc_runner.stage_one_args(extra_args, staged["target_error"])
+    first_plan = {**_plan(todo_text, first_args, None, len(todo)), "turn": plan["turn"]}
+    # stage two is counted as if every row made the cut: an upper bound
+    first_est, second_est = scheduling.estimate(first_plan, shards), scheduling.estimate(plan)
+    estimate = {**first_est, **{k: round(first_est[k] + second_est[k], 1) for k in ("core_seconds", "seconds")}}
+    if dry_run:
+        return {"memoized": len(hits), "todo": len(todo), "queue": first_plan["queue"], "estimate": estimate,
+                **_downgraded(note)}
+    first, shard_ids = _enqueue_run(first_plan, todo_text, first_args, shards, events_to=job_id)
+    # stage two re-sims a subset; the full run's timeout is its upper bound
+    job = get_queue(plan["queue"]).enqueue(
+        simc_runner.run_stage_two, first.id, base_profile, todo, extra_args or [], staged["margin"], key, memo,
+        job_id=job_id, meta=meta, job_timeout=plan["timeout"],
+        depends_on=Dependency(jobs=[first], allow_failure=True, enqueue_at_front=True), **_job_opts(),
+    )
+    scheduling.track(user, job.id, estimate, plan["turn"])
+    return {"job_id": job.id, "memoized": len(hits), "shard_job_ids": shard_ids, "stage_one_job_id": first.id,
+            "queue": first_plan["queue"], "estimate": estimate, **_downgraded(note)}
 
 @app.post("/api/top-gear")
-def top_gear(req: ProfilesetRequest):
-    text = simc_runner.generate_profilesets(req.base_profile, [p.model_dump() for p in req.profilesets])
-    job = get_queue().enqueue(simc_runner.run_simc_from_text, text, req.extra_args or [])
-    return {"job_id": job.id}
+def top_gear(req: ProfilesetRequest, request: Request):
+    with metrics.timings():
+        return _enqueue_profilesets(req.base_profile, [p.model_dump() for p in req.profilesets], req.extra_args,
+                                    req.no_cache, user=scheduling.user_id(request), dry_run=req.dry_run)
 
 @app.post("/api/parse-trinkets")
 def parse_trinkets(simc_input: str = Body(..., embed=True)):
-    items = simc_runner.extract_bag_overrides(simc_input, ("trinket1","trinket2"))
-    out = []
-    import re
-    for it in items:
-        ov = it["overrides"][0]; slot = ov.split("=",1)[0]
-        m = re.search(r"id=(\d+)", ov)
-        out.append({"name": it["name"], "slot": slot, "item_id": m.group(1) if m else None, "override": ov})
+    items = simc_runner.extract_trinkets_all(simc_input, include_equipped=False)
+    out = [{"name": it["name"], "slot": it["slot"], "override": it["override"],
+            "item_id": str(it["item_id"]) if it["item_id"] else None} for it in items]
     return {"trinkets": out}
 
 @app.post("/api/parse-trinkets-all")
@@ -76,30 +326,266 @@ def parse_trinkets_all(req: ParseTrinketsAllRequest):
     return {"trinkets": items}
 
 @app.post("/api/top-gear-trinket-pairs")
-def top_gear_trinket_pairs(req: TrinketPairsRequest):
+def top_gear_trinket_pairs(req: TrinketPairsRequest, request: Request):
     if not req.items:
         raise HTTPException(status_code=400, detail="No trinkets selected.")
     if len(req.items) > 60:
         raise HTTPException(status_code=400, detail="Too many trinkets selected (max 60).")
-    sim_text = simc_runner.make_trinket_pairs_profilesets(req.base_profile, [i.model_dump() for i in req.items])
-    job = get_queue().enqueue(simc_runner.run_simc_from_text, sim_text, req.extra_args or [])
-    return {"job_id": job.id, "pair_count": (len(req.items)*(len(req.items)-1))//2}
+    with metrics.timings():
+        with metrics.stage("profileset_gen"):
+            pairs = simc_runner.make_trinket_pairs(req.base_profile, [i.model_dump() for i in req.items])
+        pair_count = (len(req.items)*(len(req.items)-1))//2
+        staged = {"margin": req.stage_margin, "target_error": req.stage_target_error} if req.staged else None
+        out = _enqueue_profilesets(req.base_profile, pairs, req.extra_args, req.no_cache, req.shards, staged,
+                                   scheduling.user_id(request), default_shards=PAIR_SHARDS, dry_run=req.dry_run)
+    return {**out, "pair_count": pair_count}
 
-@app.get("/api/job/{job_id}")
-def job_status(job_id: str):
+@app.post("/api/top-gear-combos")
+def top_gear_combos(req: GearCombosRequest, request: Request):
+    """Top gear across slots: combinations of equipped and bag items, generated server-side."""
+    cap = min(req.max_combos or gear_combos.MAX_COMBOS, gear_combos.MAX_COMBOS)
+    with metrics.timings():
+        try:
+            with metrics.stage("profileset_gen"):
+                combos = gear_combos.build_combos(
+                    req.base_profile, cap=cap, groups=req.slots, items=req.items, tier_ids=req.tier_ids,
+                    min_tier=req.min_tier, unique_ids=req.unique_ids, max_changes=req.max_changes,
+                )
+        except gear_combos.ComboLimitError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if req.dry_run and not combos:
+            return {"combo_count": 0, "combos": combos}
+        if not combos:
+            raise HTTPException(status_code=400, detail="No gear combinations to sim.")
+        staged = {"margin": req.stage_margin, "target_error": req.stage_target_error} if req.staged else None
+        out = _enqueue_profilesets(req.base_profile, combos, req.extra_args, req.no_cache, req.shards, staged,
+                                   scheduling.user_id(request), default_shards=PAIR_SHARDS, dry_run=req.dry_run)
+        if req.dry_run:
+            return {"combo_count": len(combos), "combos": combos, **out}
+    return {**out, "combo_count": len(combos)}
+
+def _summary_of(result: dict) -> dict:
+    # results stored before summaries existed only have the full report
+    return result.get("summary") or result_view.summarize(result.get("json") or {})
+
+def _finished(result: dict, full: bool = False) -> dict:
+    out = {
+        "summary": _summary_of(result),
+        "html_url": artifacts.url_for(result.get("html_id")),
+        "json_url": artifacts.url_for(result.get("json_id")),
+        "log_url": artifacts.url_for(result.get("log_id")),
+        "stdout": result.get("stdout",""),
+    }
+    if full:
+        out["json"] = result.get("json",{})
+    return {"status":"finished","result":out}
+
+def _load_job(job_id: str) -> dict:
+    """{"status", "result"?, "error"?, "cached"?} for an RQ or cached job id (404 if unknown)."""
+    if job_id.startswith(result_cache.CACHED_JOB_PREFIX):
+        result = result_cache.get(job_id[len(result_cache.CACHED_JOB_PREFIX):])
+        if result is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return {"status": "finished", "result": result, "cached": True}
+    # one HGET decides whether the pickled job (and result) needs loading at all
+    status = read_job_status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if status not in ("finished", "failed"):
+        return {"status": status}
     from rq.job import Job
-    q = get_queue()
     try:
-        job = Job.fetch(job_id, connection=q.connection)
+        job = Job.fetch(job_id, connection=get_redis())
     except Exception:
         raise HTTPException(status_code=404, detail="Job not found")
     if job.is_finished:
-        import base64
-        result = job.result or {}
-        html_b64 = base64.b64encode((result.get("html") or "").encode("utf-8")).decode("ascii") if result.get("html") else ""
-        return {"status":"finished","result":{"json":result.get("json",{}),"html_base64":html_b64,"stdout":result.get("stdout","")}}
+        return {"status": "finished", "result": job.result or {}}
     if job.is_failed:
-        return {"status":"failed","error":str(job.exc_info)}
+        return {"status": "failed", "error": str(job.exc_info)}
     return {"status": job.get_status()}
 
+@app.get("/api/job/{job_id}")
+def job_status(job_id: str, full: bool = False):
+    """Job status; finished jobs carry a compact summary (`full=true` adds the SimC json2 report)."""
+    st = _load_job(job_id)
+    if st["status"] != "finished":
+        return st
+    return {**_finished(st["result"], full), **({"cached": True} if st.get("cached") else {})}
+
+@app.get("/api/job/{job_id}/status")
+def job_status_only(job_id: str):
+    """Just the status (cheap enough to poll): reads one field of the job hash."""
+    if job_id.startswith(result_cache.CACHED_JOB_PREFIX):
+        return {"status": "finished", "cached": True}
+    status = read_job_status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"status": status}
+
+def _with_result_bytes(job) -> dict:
+    timings = dict(job.meta.get("timings") or {})
+    size = metrics.result_bytes(job.id) if job.is_finished else None
+    if size is not None:
+        timings["result_bytes"] = size
+    return timings
+
+@app.get("/api/job/{job_id}/timings")
+def job_timings(job_id: str):
+    """
+    Per-stage timing record of a job and of the jobs it waited on (shards,
+    stage one), as stored in job.meta["timings"]; seconds, plus the size of
+    each stored result (result_bytes) once it has finished.
+    """
+    from rq.job import Job
+    if job_id.startswith(result_cache.CACHED_JOB_PREFIX):
+        return {"job_id": job_id, "cached": True, "timings": {}}
+    try:
+        job = Job.fetch(job_id, connection=get_redis())
+    except Exception:
+        raise HTTPException(status_code=404, detail="Job not found")
+    deps, todo, seen = {}, scheduling.dependency_ids(job), set()
+    while todo:
+        ids = [i for i in todo if i not in seen]
+        seen.update(ids)
+        todo = []
+        for dep in Job.fetch_many(ids, connection=get_redis()):
+            if dep is not None:
+                deps[dep.id] = _with_result_bytes(dep)
+                todo.extend(scheduling.dependency_ids(dep))
+    return {"job_id": job_id, "status": job.get_status(), "timings": _with_result_bytes(job),
+            "dependencies": deps}
+
+@app.get("/api/job/{job_id}/view")
+def job_view(job_id: str, sort: str = "mean", order: str = "desc", offset: int = 0,
+             limit: Optional[int] = None, top: Optional[int] = None, delta: str = "baseline"):
+    """Ranked profileset rows of a finished job: sorting, top-K, paging and delta vs baseline/top."""
+    st = _load_job(job_id)
+    if st["status"] != "finished":
+        return st
+    v = result_view.view(_summary_of(st["result"]), sort=sort, order=order, offset=max(0, offset),
+                         limit=limit, top=top, delta=delta)
+    return {"status": "finished", **v, "html_url": artifacts.url_for(st["result"].get("html_id"))}
+
+@app.post("/api/job/{job_id}/cancel")
+def cancel_job(job_id: str):
+    """Cancel a queued job or stop a running one (killing its simc), shards and stage one included."""
+    if job_id.startswith(result_cache.CACHED_JOB_PREFIX):
+        return {"job_id": job_id, "status": "finished", "canceled": []}
+    from rq.job import Job
+    try:
+        job = Job.fetch(job_id, connection=get_redis())
+    except Exception:
+        raise HTTPException(status_code=404, detail="Job not found")
+    canceled = scheduling.cancel(job_id, job.connection)
+    return {"job_id": job_id, "status": job.get_status(refresh=True), "canceled": canceled}
+
+@app.get("/api/artifact/{artifact_id}")
+def get_artifact(artifact_id: str, request: Request):
+    return artifacts.response(artifact_id, request)
+
+@app.get("/api/job/{job_id}/events")
+async def job_events(job_id: str):
+    """Server-sent events: status changes, SimC progress and profileset rows as they complete."""
+    if job_id.startswith(result_cache.CACHED_JOB_PREFIX):
+        async def done():
+            yield 'data: {"type": "status", "status": "finished"}\n\n'
+        events = done()
+    else:
+        events = progress.stream(job_id)
+    return StreamingResponse(events, media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# ---- Batches: many sims submitted (and tracked) as one ----
+def _submit_member(m: BatchMember, extra_args: Optional[List[str]], request: Request) -> dict:
+    kinds = [k for k in ("quick_sim", "top_gear", "trinket_pairs", "gear_combos") if getattr(m, k) is not None]
+    if len(kinds) != 1:
+        raise HTTPException(status_code=400,
+                            detail="Each member needs exactly one of quick_sim, top_gear, trinket_pairs, gear_combos.")
+    req = getattr(m, kinds[0])
+    if req.extra_args is None and extra_args is not None:
+        req = req.model_copy(update={"extra_args": extra_args})
+    if getattr(req, "dry_run", False):  # a batch member always runs
+        req = req.model_copy(update={"dry_run": False})
+    submit = {"quick_sim": quick_sim, "top_gear": top_gear, "trinket_pairs": top_gear_trinket_pairs,
+              "gear_combos": top_gear_combos}[kinds[0]]
+    return {"kind": kinds[0], **submit(req, request)}
+
+def _member_summary(result: dict) -> dict:
+    """Headline numbers of a finished member: baseline DPS and the best profileset."""
+    summary = _summary_of(result)
+    best = result_view.view(summary, top=1)["rows"]
+    return {
+        "dps": (summary.get("baseline") or {}).get("dps"),
+        "profilesets": len((summary.get("profilesets") or {}).get("name") or []),
+        "best": {"name": best[0]["name"], "mean": best[0]["mean"]} if best else None,
+        "html_url": artifacts.url_for(result.get("html_id")),
+    }
+
+@app.post("/api/batch")
+def submit_batch(req: BatchRequest, request: Request):
+    if not req.members:
+        raise HTTPException(status_code=400, detail="Empty batch.")
+    if len(req.members) > MAX_BATCH_MEMBERS:
+        raise HTTPException(status_code=400, detail=f"Too many batch members (max {MAX_BATCH_MEMBERS}).")
+    import json, uuid
+    members = []
+    token = _result_ttl.set(BATCH_TTL)
+    try:
+        for i, m in enumerate(req.members):
+            label = m.label or f"member_{i + 1}"
+            try:
+                members.append({"label": label, **_submit_member(m, req.extra_args, request)})
+            except HTTPException as e:
+                members.append({"label": label, "job_id": None, "error": e.detail})
+    finally:
+        _result_ttl.reset(token)
+    batch_id = str(uuid.uuid4())
+    get_redis().set(f"raidlocal:batch:{batch_id}", json.dumps(members), ex=BATCH_TTL)
+    return {"batch_id": batch_id, "members": members}
+
+@app.get("/api/batch/{batch_id}")
+def batch_status(batch_id: str, full: bool = False):
+    """Aggregated status plus per-member summaries (`full=true` adds each member's full result)."""
+    import json
+    from rq.job import Job
+    raw = get_redis().get(f"raidlocal:batch:{batch_id}")
+    if raw is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    members = json.loads(raw)
+
+    rq_ids = [m["job_id"] for m in members if m.get("job_id") and not m["job_id"].startswith(result_cache.CACHED_JOB_PREFIX)]
+    statuses = job_statuses(rq_ids) if rq_ids else {}
+    # only members that ended need their pickled job (result / exc_info)
+    ended_ids = [j for j in rq_ids if statuses.get(j) in ("finished", "failed")]
+    jobs = dict(zip(ended_ids, Job.fetch_many(ended_ids, connection=get_redis()))) if ended_ids else {}
+    counts: dict = {}
+    out = []
+    for m in members:
+        job_id, result, entry = m.get("job_id"), None, {"label": m["label"], "kind": m.get("kind"), "job_id": m.get("job_id")}
+        if not job_id:
+            entry.update(status="failed", error=m.get("error"))
+        elif job_id.startswith(result_cache.CACHED_JOB_PREFIX):
+            result = result_cache.get(job_id[len(result_cache.CACHED_JOB_PREFIX):])
+            entry["status"] = "finished" if result is not None else "missing"
+        else:
+            job = jobs.get(job_id)
+            if job is None:
+                entry["status"] = "missing" if job_id in ended_ids else (statuses.get(job_id) or "missing")
+            elif job.is_finished:
+                entry["status"], result = "finished", job.result or {}
+            elif job.is_failed:
+                entry.update(status="failed", error=(str(job.exc_info or "").strip().splitlines() or [None])[-1])
+            else:
+                entry["status"] = job.get_status()
+        if result is not None:
+            entry["summary"] = _member_summary(result)
+            if full:
+                entry["result"] = _finished(result, full=True)["result"]
+        counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+        out.append(entry)
+
+    ended = sum(counts.get(s, 0) for s in ("finished", "failed", "missing", "stopped", "canceled"))
+    status = "running" if ended < len(out) else ("finished" if counts.get("finished", 0) == len(out) else "finished_with_errors")
+    return {"batch_id": batch_id, "status": status, "counts": counts, "members": out}
+
 app.include_router(items_router)
\ No newline at end of file
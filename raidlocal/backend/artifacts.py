@@ -0,0 +1,202 @@
+# backend/artifacts.py
+from __future__ import annotations
+
+import gzip
+import hashlib
+import io
+import os
+import re
+import tempfile
+import time
+from typing import Optional
+
+from fastapi import HTTPException, Request
+from fastapi.responses import FileResponse, Response
+
+from .queue_utils import get_redis
+
+# Report files (HTML, JSON, logs) live on a volume shared by web and workers;
+# job results only carry their ids. Ids are content hashes, so identical
+# reports are stored once and the id doubles as the ETag.
+ARTIFACT_DIR = os.environ.get("SIMC_ARTIFACT_DIR", "artifacts")
+ARTIFACT_TTL = int(os.environ.get("SIMC_ARTIFACT_TTL", str(60 * 60 * 24 * 7)))  # 7 days
+# Sim nodes on other boxes don't see the volume: they hand artifacts to the
+# web process through Redis (gzipped), which moves them to disk on first use.
+ARTIFACT_SHARED = os.environ.get("SIMC_ARTIFACT_SHARED", "1") != "0"
+ARTIFACT_UPLOAD_TTL = int(os.environ.get("SIMC_ARTIFACT_UPLOAD_TTL", str(60 * 60 * 6)))
+
+MEDIA_TYPES = {"html": "text/html; charset=utf-8", "json": "application/json", "txt": "text/plain; charset=utf-8"}
+_ID = re.compile(r"^(?P<sha>[0-9a-f]{64})\.(?P<ext>html|json|txt)$")
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+_CHUNK = 1024 * 1024
+_PRUNE_MARKER = ".last_prune"  # its mtime is when the store was last pruned
+_UPLOAD = "raidlocal:artifact:"
+
+
+def _path(artifact_id: str) -> str:
+    return os.path.join(ARTIFACT_DIR, artifact_id[:2], artifact_id)
+
+
+def url_for(artifact_id: Optional[str]) -> str:
+    return f"/api/artifact/{artifact_id}" if artifact_id else ""
+
+
+# ---- Store (worker side) ----
+def save_file(src: str, ext: str) -> Optional[str]:
+    """
+    Copy `src` into the store (plus a gzip copy) without loading it into
+    memory; returns the artifact id, or None if `src` doesn't exist. On
+    nodes without the shared volume it is uploaded to Redis instead.
+    """
+    if not os.path.exists(src):
+        return None
+    h = hashlib.sha256()
+    with open(src, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK), b""):
+            h.update(chunk)
+    artifact_id = f"{h.hexdigest()}.{ext}"
+    if not ARTIFACT_SHARED:
+        _upload(src, artifact_id)
+        return artifact_id
+    dst = _path(artifact_id)
+    if os.path.exists(dst) and os.path.exists(dst + ".gz"):
+        os.utime(dst)
+        os.utime(dst + ".gz")
+        return artifact_id
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    # write to temp names first so readers never see partial files
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(dst))
+    fdz, tmpz = tempfile.mkstemp(dir=os.path.dirname(dst))
+    try:
+        with open(src, "rb") as f, os.fdopen(fd, "wb") as out, os.fdopen(fdz, "wb") as zf:
+            with gzip.GzipFile(fileobj=zf, mode="wb", compresslevel=6) as gz:
+                for chunk in iter(lambda: f.read(_CHUNK), b""):
+                    out.write(chunk)
+                    gz.write(chunk)
+        os.replace(tmpz, dst + ".gz")
+        os.replace(tmp, dst)
+    finally:
+        for t in (tmp, tmpz):
+            if os.path.exists(t):
+                os.unlink(t)
+    prune()
+    return artifact_id
+
+
+def _upload(src: str, artifact_id: str) -> None:
+    r = get_redis()
+    if r.expire(_UPLOAD + artifact_id, ARTIFACT_UPLOAD_TTL):
+        return
+    buf = io.BytesIO()
+    with open(src, "rb") as f, gzip.GzipFile(fileobj=buf, mode="wb", compresslevel=6) as gz:
+        for chunk in iter(lambda: f.read(_CHUNK), b""):
+            gz.write(chunk)
+    r.set(_UPLOAD + artifact_id, buf.getvalue(), ex=ARTIFACT_UPLOAD_TTL)
+
+
+def _download(artifact_id: str) -> bool:
+    """Move an artifact a remote node uploaded into the store; False if there is none."""
+    try:
+        blob = get_redis().get(_UPLOAD + artifact_id)
+    except Exception:
+        return False
+    if blob is None:
+        return False
+    dst = _path(artifact_id)
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(dst))
+    fdz, tmpz = tempfile.mkstemp(dir=os.path.dirname(dst))
+    try:
+        with os.fdopen(fdz, "wb") as zf:
+            zf.write(blob)
+        with gzip.GzipFile(fileobj=io.BytesIO(blob)) as gz, os.fdopen(fd, "wb") as out:
+            for chunk in iter(lambda: gz.read(_CHUNK), b""):
+                out.write(chunk)
+        os.replace(tmpz, dst + ".gz")
+        os.replace(tmp, dst)
+    finally:
+        for t in (tmp, tmpz):
+            if os.path.exists(t):
+                os.unlink(t)
+    get_redis().delete(_UPLOAD + artifact_id)
+    return True
+
+
+def save_text(text: str, ext: str) -> Optional[str]:
+    if not text:
+        return None
+    with tempfile.NamedTemporaryFile("w", encoding="utf-8", suffix="." + ext, delete=False) as f:
+        f.write(text)
+    try:
+        return save_file(f.name, ext)
+    finally:
+        os.unlink(f.name)
+
+
+def prune(max_age: int = ARTIFACT_TTL) -> None:
+    """
+    Drop artifacts not written or re-used for `max_age` seconds. Runs at most
+    hourly across all processes (work horses are forked per job, so the last
+    run is kept on disk rather than in memory).
+    """
+    now = time.time()
+    marker = os.path.join(ARTIFACT_DIR, _PRUNE_MARKER)
+    try:
+        if now - os.path.getmtime(marker) < 3600:
+            return
+    except OSError:
+        pass
+    try:
+        with open(marker, "a"):
+            os.utime(marker)
+    except OSError:
+        return
+    for root, _, files in os.walk(ARTIFACT_DIR):
+        for name in files:
+            if name == _PRUNE_MARKER:
+                continue
+            p = os.path.join(root, name)
+            try:
+                if now - os.path.getmtime(p) > max_age:
+                    os.unlink(p)
+            except OSError:
+                pass
+
+
+# ---- Serve (API side) ----
+def response(artifact_id: str, request: Request) -> Response:
+    """Artifact download with ETag/304, single byte-range and gzip support."""
+    m = _ID.match(artifact_id)
+    path = _path(artifact_id) if m else ""
+    if not m or not (os.path.exists(path) or _download(artifact_id)):
+        raise HTTPException(status_code=404, detail="Artifact not found")
+    etag = f'"{m.group("sha")}"'
+    media_type = MEDIA_TYPES[m.group("ext")]
+    headers = {"ETag": etag, "Accept-Ranges": "bytes", "Cache-Control": "private, max-age=86400, immutable",
+               "Vary": "Accept-Encoding"}
+
+    if etag in (request.headers.get("if-none-match") or ""):
+        return Response(status_code=304, headers=headers)
+
+    # Only a well-formed single byte range is honored; anything else (multiple
+    # ranges, other units, garbage) is ignored and the whole file sent (RFC 7233 3.1)
+    r = _RANGE.match((request.headers.get("range") or "").strip())
+    if r and (r.group(1) or r.group(2)) and not (r.group(1) and r.group(2) and int(r.group(2)) < int(r.group(1))):
+        size = os.path.getsize(path)
+        if r.group(1):
+            start = int(r.group(1))
+            end = min(int(r.group(2)), size - 1) if r.group(2) else size - 1
+        else:  # suffix range: last N bytes
+            start, end = max(0, size - int(r.group(2))), size - 1
+        if start >= size or end < start:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        with open(path, "rb") as f:
+            f.seek(start)
+            body = f.read(end - start + 1)
+        return Response(body, status_code=206, media_type=media_type,
+                        headers={**headers, "Content-Range": f"bytes {start}-{end}/{size}"})
+
+    if "gzip" in (request.headers.get("accept-encoding") or "") and os.path.exists(path + ".gz"):
+        return FileResponse(path + ".gz", media_type=media_type, headers={**headers, "Content-Encoding": "gzip"})
+    return FileResponse(path, media_type=media_type, headers=headers)
+
@@ -0,0 +1,140 @@
+# backend/cpu_budget.py
+from __future__ import annotations
+
+import os
+import re
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+from .queue_utils import get_redis
+
+# Every simc run leases its threads from a per-host core budget kept in Redis,
+# so concurrent jobs on one box (an `rq worker-pool`, or several worker
+# containers sharing SIMC_HOST_ID) never add up to more threads than cores.
+CORES = int(os.environ.get("SIMC_CORES") or os.cpu_count() or 1)
+MAX_JOB_THREADS = min(CORES, int(os.environ.get("SIMC_MAX_JOB_THREADS") or CORES))
+# Threads a single-actor sim gets when the user didn't ask for a number;
+# smaller than the box so several quick sims run side by side.
+QUICK_THREADS = min(MAX_JOB_THREADS, int(os.environ.get("SIMC_QUICK_THREADS") or max(1, CORES // 2)))
+HOST_ID = os.environ.get("SIMC_HOST_ID") or socket.gethostname()
+# Cores only jobs from the quick queue may lease, so quick sims still start
+# while bigger runs hold the rest of the box.
+QUICK_RESERVE = min(CORES - 1, int(os.environ.get("SIMC_QUICK_RESERVE") or max(1, CORES // 8)))
+
+_KEY = "raidlocal:cpu:"
+_LEASE_TTL = 30  # seconds; renewed while simc runs, so crashed jobs free their cores
+_THREADS = re.compile(r"^\s*threads\s*=\s*(\d+)\s*$")
+
+# Drop expired leases, then grant min(want, free) threads if at least `min` are free.
+_ACQUIRE = """
+local now = tonumber(ARGV[5])
+local used = 0
+local all = redis.call('HGETALL', KEYS[1])
+for i = 1, #all, 2 do
+  local threads, expiry = string.match(all[i + 1], '(%d+):(%d+)')
+  if tonumber(expiry) < now then
+    redis.call('HDEL', KEYS[1], all[i])
+  else
+    used = used + tonumber(threads)
+  end
+end
+local free = tonumber(ARGV[4]) - used
+if free < tonumber(ARGV[3]) then return 0 end
+local grant = math.min(tonumber(ARGV[2]), free)
+redis.call('HSET', KEYS[1], ARGV[1], grant .. ':' .. (now + tonumber(ARGV[6])))
+return grant
+"""
+
+
+def requested_threads(extra_args: Optional[List[str]]) -> Optional[int]:
+    """Last `threads=` value in extra_args (SimC uses the last one), if any."""
+    n = None
+    for a in extra_args or []:
+        m = _THREADS.match(a)
+        if m:
+            n = int(m.group(1))
+    return n
+
+
+def wanted_threads(extra_args: Optional[List[str]], profilesets: int = 0) -> int:
+    """User's thread count clamped to the per-job cap, or a size-based default."""
+    n = requested_threads(extra_args)
+    if n is None:
+        n = MAX_JOB_THREADS if profilesets else QUICK_THREADS
+    return max(1, min(n, MAX_JOB_THREADS))
+
+
+def with_threads(extra_args: Optional[List[str]], threads: int) -> List[str]:
+    """extra_args with every `threads=` replaced by one that comes last (and wins)."""
+    return [a for a in (extra_args or []) if not _THREADS.match(a)] + [f"threads={threads}"]
+
+
+@contextmanager
+def lease(want: int, on_wait=None, poll: float = 0.5, reserve: int = 0) -> Iterator[int]:
+    """
+    Block until at least one core is free on this host, then hold
+    min(want, free) of them; yields the granted thread count. `reserve`
+    cores are left alone (see QUICK_RESERVE). Falls back to `want` (already
+    clamped) if Redis is unreachable.
+    """
+    key, lease_id = _KEY + HOST_ID, uuid.uuid4().hex
+    pool = max(1, CORES - reserve)
+    want = min(want, pool)
+    try:
+        r = get_redis()
+        acquire = r.register_script(_ACQUIRE)
+        waited = False
+        while True:
+            grant = int(acquire(keys=[key], args=[lease_id, want, 1, pool, int(time.time()), _LEASE_TTL]))
+            if grant:
+                break
+            if on_wait and not waited:
+                on_wait()
+                waited = True
+            time.sleep(poll)
+    except Exception:
+        r, grant = None, want
+    if r is None:
+        yield grant
+        return
+
+    stop = threading.Event()
+
+    def renew():
+        while not stop.wait(_LEASE_TTL / 3):
+            try:
+                r.hset(key, lease_id, f"{grant}:{int(time.time()) + _LEASE_TTL}")
+            except Exception:
+                pass
+
+    t = threading.Thread(target=renew, daemon=True)
+    t.start()
+    try:
+        yield grant
+    finally:
+        stop.set()
+        t.join()
+        try:
+            r.hdel(key, lease_id)
+        except Exception:
+            pass
+
+
+def usage() -> Dict[str, int]:
+    """{host id: threads currently leased} across every host (for /metrics)."""
+    r = get_redis()
+    now = time.time()
+    out: Dict[str, int] = {}
+    for key in r.scan_iter(match=_KEY + "*"):
+        host = key.decode()[len(_KEY):]
+        used = 0
+        for raw in r.hvals(key):
+            threads, _, expiry = raw.decode().partition(":")
+            if expiry and int(expiry) >= now:
+                used += int(threads)
+        out[host] = used
+    return out
@@ -0,0 +1,201 @@
+# backend/gear_combos.py
+from __future__ import annotations
+
+import hashlib
+import os
+from collections import Counter
+from itertools import combinations, islice
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from . import simc_export
+from .simc_runner import _is_two_handed, _is_unique, _meta_map_for_ids, _sanitize_name
+
+# Multi-slot top gear: every way of swapping equipped items for bag items,
+# as profileset defs ({"name", "overrides"}) for generate_profilesets.
+# Each slot group is filled by one "choice" (a tuple of (slot, item)):
+# rings and trinkets as unordered pairs, main/off hand together, everything
+# else one item. A two-hander (per its item metadata) always comes with an
+# empty off hand; a one-hander pairs with each off hand, also when a
+# two-hander is equipped. Combos are produced lazily, smallest changes first, and
+# the whole thing is rejected past `cap` before anything is queued.
+# Groups are filled one at a time and a branch is dropped as soon as it
+# breaks a unique-equipped rule or can no longer reach `min_tier`; the
+# partial assignments visited are capped too (MAX_EXAMINED), so constraints
+# that reject almost everything can't turn into an unbounded search.
+GROUPS = ("head", "neck", "shoulder", "back", "chest", "wrist", "hands", "waist", "legs", "feet",
+          "finger", "trinket", "weapons")
+TIER_SLOTS = ("head", "shoulder", "chest", "hands", "legs")
+MAX_COMBOS = int(os.environ.get("SIMC_MAX_COMBOS", "500"))
+MAX_EXAMINED = int(os.environ.get("SIMC_MAX_COMBOS_EXAMINED", "100000"))
+
+_PAIRS = {"finger": ("finger1", "finger2"), "trinket": ("trinket1", "trinket2")}
+
+Choice = Tuple[Tuple[str, simc_export.Item], ...]
+
+_EMPTY_OFF_HAND = simc_export.Item(slot="off_hand", tail="", source="empty")  # "off_hand="
+
+
+class ComboLimitError(ValueError):
+    def __init__(self, cap: int, what: str = "gear combinations"):
+        super().__init__(f"More than {cap} {what}; select fewer items or limit max_changes.")
+        self.cap = cap
+
+
+def _equipped_choice(model: simc_export.Profile, slots: Sequence[str]) -> Choice:
+    return tuple((s, model.equipped[s]) for s in slots if s in model.equipped)
+
+
+def _group_slots(group: str) -> Tuple[str, ...]:
+    if group in _PAIRS:
+        return _PAIRS[group]
+    if group == "weapons":
+        return ("main_hand", "off_hand")
+    return (group,)
+
+
+def _tier_pieces(choice, tier: set) -> int:
+    return sum(1 for s, it in choice if s in TIER_SLOTS and it.item_id in tier)
+
+
+def _same(a: Choice, b: Choice) -> bool:
+    return {(it.group, it.key) for _, it in a} == {(it.group, it.key) for _, it in b}
+
+
+def _weapon_sets(model: simc_export.Profile, allowed, two_handed: Dict[int, bool]) -> List[Choice]:
+    mains = [it for it in model.candidates("main_hand") if allowed(it)]
+    offs = [it for it in model.candidates("off_hand") if allowed(it)]
+    dual = "off_hand" in model.equipped
+    out: List[Choice] = []
+    for m in mains:
+        th = two_handed.get(m.item_id)
+        if th:
+            out.append((("main_hand", m), ("off_hand", _EMPTY_OFF_HAND)) if dual else (("main_hand", m),))
+        elif (th is False or dual) and offs:
+            out += [(("main_hand", m), ("off_hand", o)) for o in offs]
+        else:  # no metadata and a two-hander equipped: the main hand is the whole weapon set
+            out.append((("main_hand", m),))
+    return out
+
+
+def _alternatives(model: simc_export.Profile, group: str, allowed,
+                  two_handed: Optional[Dict[int, bool]] = None) -> List[Choice]:
+    """Ways to fill one slot group other than the equipped gear."""
+    if group in _PAIRS:
+        slots = _PAIRS[group]
+        cands = [it for it in model.candidates(group) if allowed(it)]
+        out = []
+        for a, b in combinations(cands, 2):
+            # two copies of one trinket can't be equipped (same rule as make_trinket_pairs)
+            if group == "trinket" and a.item_id and a.item_id == b.item_id:
+                continue
+            out.append(((slots[0], a), (slots[1], b)))
+    elif group == "weapons":
+        out = _weapon_sets(model, allowed, two_handed or {})
+        slots = ("main_hand", "off_hand")
+    else:
+        slots = (group,)
+        out = [((group, it),) for it in model.candidates(group) if allowed(it)]
+
+    equipped = _equipped_choice(model, slots)
+    return [c for c in out if not _same(c, equipped)]
+
+
+def _combo_name(changes: Dict[str, Choice], overrides: List[str], taken: set) -> str:
+    raw = "TG_" + "_".join(f"{g}_" + "_".join(str(it.item_id or 0) for _, it in c) for g, c in changes.items())
+    name = _sanitize_name(raw)
+    if len(raw) > 64 or name in taken:
+        # truncated, or same ids with other bonus ids: add a digest of the overrides
+        digest = hashlib.sha1("|".join(overrides).encode()).hexdigest()[:7]
+        name = name[:56].rstrip("_") + "_" + digest
+    taken.add(name)
+    return name
+
+
+def iter_combos(base_profile: str, groups: Optional[Iterable[str]] = None, items: Optional[Iterable[str]] = None,
+                tier_ids: Iterable[int] = (), min_tier: int = 0, unique_ids: Iterable[int] = (),
+                max_changes: Optional[int] = None, max_examined: int = MAX_EXAMINED) -> Iterator[Dict]:
+    """
+    Lazily yield profileset defs for gear combinations of `base_profile`.
+
+    groups:      slot groups to vary (default: all of GROUPS)
+    items:       overrides the user picked ("finger1=,id=..."); bag items not listed are
+                 ignored. None = every bag item.
+    tier_ids:    item ids of the tier set; combos below `min_tier` pieces are skipped
+    unique_ids:  extra unique-equipped ids (item metadata is consulted as well)
+    max_changes: at most this many slot groups differ from the equipped gear
+    max_examined: ComboLimitError once this many partial assignments were tried
+    """
+    model = simc_export.parse(base_profile)
+    picked = None
+    if items is not None:
+        picked = set()
+        for ov in items:
+            slot, _, rhs = ov.partition("=")
+            rhs = rhs.strip()
+            picked.add((simc_export.slot_group(slot.strip()), rhs if rhs.startswith(",") else "," + rhs))
+
+    def allowed(it: simc_export.Item) -> bool:
+        return it.source == "equipped" or picked is None or (it.group, it.key) in picked
+
+    groups = [g for g in (groups or GROUPS) if g in GROUPS]
+    slots = {s for g in groups for s in _group_slots(g)}
+    ids = {it.item_id for it in model.equipped.values() if it.item_id}
+    ids |= {it.item_id for it in model.bag_items(slots) if it.item_id and allowed(it)}
+    metas = _meta_map_for_ids(sorted(ids))
+    two_handed = {i: th for i, m in metas.items() if (th := _is_two_handed(m)) is not None}
+    alts = {g: a for g in groups if (a := _alternatives(model, g, allowed, two_handed))}
+    unique = {i for i, m in metas.items() if _is_unique(m)} | set(unique_ids)
+    tier = set(tier_ids)
+
+    varied = list(alts)
+    most = len(varied) if max_changes is None else min(max_changes, len(varied))
+    # most tier pieces each group's alternatives can add
+    tier_gain = {g: max(_tier_pieces(c, tier) for c in alts[g]) for g in varied}
+    seen, names = set(), set()
+    examined = 0
+
+    def fill(gs, i, picks, tier_count, counts):
+        """Choices for gs[i:], given the gear picked so far; yields complete `picks` tuples."""
+        nonlocal examined
+        if i == len(gs):
+            yield picks
+            return
+        rest = sum(tier_gain[g] for g in gs[i + 1:])
+        for c in alts[gs[i]]:
+            examined += 1
+            if examined > max_examined:
+                raise ComboLimitError(max_examined, "gear combinations to check")
+            gain = _tier_pieces(c, tier)
+            if tier and tier_count + gain + rest < min_tier:
+                continue
+            added = [it.item_id for _, it in c if it.item_id]
+            if any(u in unique and counts[u] + added.count(u) > 1 for u in added):
+                continue
+            counts.update(added)
+            yield from fill(gs, i + 1, picks + (c,), tier_count + gain, counts)
+            counts.subtract(added)
+
+    for k in range(1, most + 1):
+        for gs in combinations(varied, k):
+            replaced = {s for g in gs for s in _group_slots(g)}
+            kept = [(s, it) for s, it in model.equipped.items() if s not in replaced]
+            base_tier = _tier_pieces(kept, tier)
+            if tier and base_tier + sum(tier_gain[g] for g in gs) < min_tier:
+                continue
+            counts = Counter(it.item_id for _, it in kept if it.item_id)
+            for picks in fill(gs, 0, (), base_tier, counts):
+                changes = dict(zip(gs, picks))
+                overrides = [f"{s}={it.tail}" for c in picks for s, it in c]
+                key = frozenset(overrides)
+                if key in seen:
+                    continue
+                seen.add(key)
+                yield {"name": _combo_name(changes, overrides, names), "overrides": overrides}
+
+
+def build_combos(base_profile: str, cap: int = MAX_COMBOS, **kwargs) -> List[Dict]:
+    """All combos from iter_combos, or ComboLimitError if there are more than `cap`."""
+    combos = list(islice(iter_combos(base_profile, **kwargs), cap + 1))
+    if len(combos) > cap:
+        raise ComboLimitError(cap)
+    return combos
@@ -2,8 +2,12 @@
 from __future__ import annotations
 
 import asyncio
+import json
+import os
+import threading
 import time
 import re
+import weakref
 import xml.etree.ElementTree as ET
 from typing import Dict, Optional, List
 
@@ -11,6 +15,9 @@ import httpx
 from pydantic import BaseModel
 from fastapi import APIRouter, Query
 
+from . import item_store, metrics
+from .queue_utils import close_async_redis, get_async_redis
+
 def _detect_unique_equipped(text: str | None) -> bool:
     if not text:
         return False
@@ -32,9 +39,88 @@ class ItemMeta(BaseModel):
     unique_equipped: bool = False
     tooltip_html: str | None = None
 
-# ---- Tiny in-memory cache ----
+# ---- Caches: per-process (expiry, meta) in front of a shared Redis copy ----
 _CACHE: Dict[int, tuple[float, ItemMeta]] = {}
 _TTL = 60 * 60 * 6  # 6 hours
+_NEG_TTL = 60 * 30  # lookups that found nothing are retried after 30 minutes
+_REDIS_PREFIX = "raidlocal:item:"
+_MAX_CONCURRENCY = int(os.environ.get("ITEM_FETCH_CONCURRENCY", "8"))
+# Set to 0 in air-gapped deploys: only the offline store and caches are used
+_FETCH_REMOTE = os.environ.get("ITEM_FETCH_REMOTE", "1") != "0"
+
+
+class _LoopState:
+    """Long-lived HTTP client, Redis client and in-flight lookups of one event loop."""
+
+    def __init__(self) -> None:
+        self.client = httpx.AsyncClient(
+            timeout=10.0,
+            headers={"User-Agent": "raidlocal/0.1"},
+            limits=httpx.Limits(max_connections=_MAX_CONCURRENCY, max_keepalive_connections=_MAX_CONCURRENCY),
+        )
+        self.redis = get_async_redis()  # shared per loop, closed by queue_utils
+        self.inflight: Dict[int, asyncio.Future] = {}
+        self.sem = asyncio.Semaphore(_MAX_CONCURRENCY)
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+
+_STATES: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopState]" = weakref.WeakKeyDictionary()
+
+
+def _state() -> _LoopState:
+    loop = asyncio.get_running_loop()
+    st = _STATES.get(loop)
+    if st is None:
+        st = _STATES[loop] = _LoopState()
+    return st
+
+
+def _remember(meta: ItemMeta, found: bool) -> None:
+    _CACHE[meta.id] = (time.time() + (_TTL if found else _NEG_TTL), meta)
+
+
+def _store_get(ids: List[int]) -> Dict[int, ItemMeta]:
+    """Read ids from the offline item store (and keep them locally)."""
+    out: Dict[int, ItemMeta] = {}
+    for i, row in item_store.lookup(ids).items():
+        meta = ItemMeta(**row)
+        _remember(meta, True)
+        out[i] = meta
+    metrics.incr("item_meta_store", len(out))
+    return out
+
+
+async def _shared_get(ids: List[int]) -> Dict[int, ItemMeta]:
+    """Read ids from the shared Redis cache (and keep them locally); {} on any error."""
+    if not ids:
+        return {}
+    try:
+        raw = await _state().redis.mget([f"{_REDIS_PREFIX}{i}" for i in ids])
+    except Exception:
+        return {}
+    out: Dict[int, ItemMeta] = {}
+    for i, blob in zip(ids, raw):
+        if blob is None:
+            continue
+        try:
+            d = json.loads(blob)
+            meta = ItemMeta(**d["meta"])
+        except Exception:
+            continue
+        _remember(meta, d.get("found", True))
+        out[i] = meta
+    metrics.incr("item_meta_redis", len(out))
+    return out
+
+
+async def _shared_put(meta: ItemMeta, found: bool) -> None:
+    try:
+        blob = json.dumps({"meta": meta.model_dump(), "found": found})
+        await _state().redis.set(f"{_REDIS_PREFIX}{meta.id}", blob, ex=_TTL if found else _NEG_TTL)
+    except Exception:
+        pass
 
 # ---- Helpers ----
 def _is_unique_equipped(tooltip_html: Optional[str]) -> bool:
@@ -56,65 +142,90 @@ async def fetch_item_from_wowhead(item_id: int) -> Optional[ItemMeta]:
         f"https://www.wowhead.com/tooltip/item/{item_id}?json",
     ]
     try:
-        async with httpx.AsyncClient(timeout=10.0, headers={"User-Agent": "raidlocal/0.1"}) as client:
-            for u in urls:
-                try:
-                    r = await client.get(u)
-                    if r.status_code == 200:
-                        j = r.json()
-                        name = j.get("name") or j.get("title")
-                        icon = j.get("icon")
-                        ilvl = j.get("ilvl") or j.get("level")
-                        quality = j.get("quality") or j.get("q")
-                        tip = j.get("tooltip") or j.get("tooltip_html")
-                        unique = _detect_unique_equipped(tip)
-                        return ItemMeta(
-                            id=item_id,
-                            name=name,
-                            icon=icon,
-                            ilvl=int(ilvl) if isinstance(ilvl, (int, float, str)) and str(ilvl).isdigit() else None,
-                            quality=int(quality) if isinstance(quality, (int, float, str)) and str(quality).isdigit() else None,
-                            unique_equipped=unique,
-                            tooltip_html=tip,
-                        )
-                except Exception:
-                    pass
-
-            # Fallback: old XML endpoint (no tooltip here, so unique_equipped stays False)
+        client = _state().client
+        for u in urls:
             try:
-                r = await client.get(f"https://www.wowhead.com/item={item_id}&xml")
+                r = await client.get(u)
                 if r.status_code == 200:
-                    root = ET.fromstring(r.text)
-                    item = root.find(".//item")
-                    if item is not None:
-                        name = item.findtext("name")
-                        icon = item.findtext("icon")
-                        ilvl_text = item.findtext("level")
-                        qual_text = item.findtext("quality", default="")
-                        # Sometimes "quality" is like "q4"
-                        q_match = re.search(r"q(\d+)", qual_text or "")
-                        quality = int(q_match.group(1)) if q_match else None
-                        ilvl = int(ilvl_text) if (ilvl_text and ilvl_text.isdigit()) else None
-                        xml_text = ET.tostring(root, encoding="unicode", method="xml")
-                        unique = _detect_unique_equipped(xml_text)
-                        return ItemMeta(
-                            id=item_id, name=name, icon=icon, ilvl=ilvl, quality=quality,
-                            unique_equipped=unique
-                        )
-
+                    j = r.json()
+                    name = j.get("name") or j.get("title")
+                    icon = j.get("icon")
+                    ilvl = j.get("ilvl") or j.get("level")
+                    quality = j.get("quality") or j.get("q")
+                    tip = j.get("tooltip") or j.get("tooltip_html")
+                    unique = _detect_unique_equipped(tip)
+                    return ItemMeta(
+                        id=item_id,
+                        name=name,
+                        icon=icon,
+                        ilvl=int(ilvl) if isinstance(ilvl, (int, float, str)) and str(ilvl).isdigit() else None,
+                        quality=int(quality) if isinstance(quality, (int, float, str)) and str(quality).isdigit() else None,
+                        unique_equipped=unique,
+                        tooltip_html=tip,
+                    )
             except Exception:
                 pass
+
+        # Fallback: old XML endpoint (no tooltip here, so unique_equipped stays False)
+        try:
+            r = await client.get(f"https://www.wowhead.com/item={item_id}&xml")
+            if r.status_code == 200:
+                root = ET.fromstring(r.text)
+                item = root.find(".//item")
+                if item is not None:
+                    name = item.findtext("name")
+                    icon = item.findtext("icon")
+                    ilvl_text = item.findtext("level")
+                    qual_text = item.findtext("quality", default="")
+                    # Sometimes "quality" is like "q4"
+                    q_match = re.search(r"q(\d+)", qual_text or "")
+                    quality = int(q_match.group(1)) if q_match else None
+                    ilvl = int(ilvl_text) if (ilvl_text and ilvl_text.isdigit()) else None
+                    xml_text = ET.tostring(root, encoding="unicode", method="xml")
+                    unique = _detect_unique_equipped(xml_text)
+                    return ItemMeta(
+                        id=item_id, name=name, icon=icon, ilvl=ilvl, quality=quality,
+                        unique_equipped=unique
+                    )
+
+        except Exception:
+            pass
     except Exception:
         pass
     return None
 
 async def get_item_meta(item_id: int) -> ItemMeta:
-    now = time.time()
     hit = _CACHE.get(item_id)
-    if hit and (now - hit[0] < _TTL):
+    if hit and time.time() < hit[0]:
+        metrics.incr("item_meta_local")
+    return await _get_item_meta(item_id, check_shared=True)
+
+async def _get_item_meta(item_id: int, check_shared: bool) -> ItemMeta:
+    hit = _CACHE.get(item_id)
+    if hit and time.time() < hit[0]:
         return hit[1]
-    meta = await fetch_item_from_wowhead(item_id) or ItemMeta(id=item_id)
-    _CACHE[item_id] = (now, meta)
+    # Single flight: concurrent callers for the same id share one lookup
+    st = _state()
+    fut = st.inflight.get(item_id)
+    if fut is None:
+        fut = asyncio.ensure_future(_lookup(item_id, check_shared))
+        st.inflight[item_id] = fut
+        fut.add_done_callback(lambda _: st.inflight.pop(item_id, None))
+    return await asyncio.shield(fut)
+
+async def _lookup(item_id: int, check_shared: bool) -> ItemMeta:
+    if check_shared:
+        found = _store_get([item_id]) or await _shared_get([item_id])
+        if item_id in found:
+            return found[item_id]
+    fetched = None
+    if _FETCH_REMOTE:
+        async with _state().sem:
+            fetched = await fetch_item_from_wowhead(item_id)
+    meta = fetched or ItemMeta(id=item_id)
+    metrics.incr("item_meta_remote" if fetched is not None else "item_meta_miss")
+    _remember(meta, fetched is not None)
+    await _shared_put(meta, fetched is not None)
     return meta
 
 async def get_items_meta_async(ids: List[int]) -> List[ItemMeta]:
@@ -122,36 +233,50 @@ async def get_items_meta_async(ids: List[int]) -> List[ItemMeta]:
     # Dedup, preserve order
     seen: set[int] = set()
     ordered = [i for i in ids if isinstance(i, int) and not (i in seen or seen.add(i))]
-    metas = await asyncio.gather(*(get_item_meta(i) for i in ordered))
+    # Offline store first, then one Redis round trip for what's still missing
+    now = time.time()
+    missing = [i for i in ordered if not (i in _CACHE and now < _CACHE[i][0])]
+    metrics.incr("item_meta_local", len(ordered) - len(missing))
+    found = _store_get(missing)
+    await _shared_get([i for i in missing if i not in found])
+    metas = await asyncio.gather(*(_get_item_meta(i, check_shared=False) for i in ordered))
     return metas
 
+# Sync callers share one long-lived loop (and so one client, pool and set of
+# in-flight lookups) instead of spinning up a loop per call.
+_BG_LOOP: Optional[asyncio.AbstractEventLoop] = None
+_BG_LOCK = threading.Lock()
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    global _BG_LOOP
+    with _BG_LOCK:
+        if _BG_LOOP is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="item-meta", daemon=True).start()
+            _BG_LOOP = loop
+    return _BG_LOOP
+
+def _reset_after_fork() -> None:
+    # the loop thread doesn't survive fork (e.g. RQ work-horses)
+    global _BG_LOOP, _BG_LOCK
+    _BG_LOOP, _BG_LOCK = None, threading.Lock()
+    _STATES.clear()
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
 def get_items_meta(ids: List[int]) -> List[ItemMeta]:
     """
     Sync wrapper for codepaths that are not async (e.g., simc_runner building profilesets).
-    Uses asyncio.run() only if there is no running loop.
+    Safe to call from inside a running loop: the work happens on the background loop.
     """
-    try:
-        loop = asyncio.get_running_loop()
-    except RuntimeError:
-        loop = None
-
-    if loop and loop.is_running():
-        # When called from an async context we cannot block the running loop.
-        # Run the async helper in a separate thread with its own event loop.
-        import threading
-
-        result: List[ItemMeta] = []
-
-        def runner() -> None:
-            nonlocal result
-            result = asyncio.run(get_items_meta_async(ids))
-
-        t = threading.Thread(target=runner)
-        t.start()
-        t.join()
-        return result
-    else:
-        return asyncio.run(get_items_meta_async(ids))
+    return asyncio.run_coroutine_threadsafe(get_items_meta_async(ids), _background_loop()).result(timeout=120)
+
+async def close_clients() -> None:
+    """Close this event loop's HTTP and Redis clients (called from app.py's lifespan on shutdown)."""
+    st = _STATES.pop(asyncio.get_running_loop(), None)
+    if st:
+        await st.aclose()
+    await close_async_redis()
 
 # ---- Router endpoint (NO reference to `app` here) ----
 @router.get("/api/items", response_model=list[ItemMeta])
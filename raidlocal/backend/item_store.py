@@ -0,0 +1,215 @@
+# backend/item_store.py
+"""
+Offline item metadata (id -> name, icon, ilvl, quality, unique-equipped) in a
+local SQLite file, consulted by item_parser before any cache or HTTP lookup.
+
+Build or refresh it from a dump (JSON lines, JSON array or CSV with a header):
+
+    python -m backend.item_store import items.jsonl [--db data/items.sqlite]
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+ITEM_DB_PATH = os.environ.get("ITEM_DB_PATH", "data/items.sqlite")
+# preload() skips stores bigger than this
+ITEM_PRELOAD_MAX_ROWS = int(os.environ.get("ITEM_PRELOAD_MAX_ROWS", "500000"))
+
+FIELDS = ("id", "name", "icon", "ilvl", "quality", "unique_equipped", "tooltip_html")
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY,
+    name TEXT,
+    icon TEXT,
+    ilvl INTEGER,
+    quality INTEGER,
+    unique_equipped INTEGER NOT NULL DEFAULT 0,
+    tooltip_html TEXT
+)
+"""
+_BATCH = 500  # ids per IN (...) query
+
+_local = threading.local()
+# (db path, inode) -> every row, filled by preload(); see there
+_preloaded: Optional[Tuple[Tuple[str, int], Dict[int, Dict]]] = None
+
+
+def _reset_after_fork() -> None:
+    # sqlite connections must not be shared with a forked child
+    global _local
+    _local = threading.local()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _connection(db_path: str) -> Optional[sqlite3.Connection]:
+    """Read-only connection for this thread; reopened when the file is replaced."""
+    try:
+        inode = os.stat(db_path).st_ino
+    except OSError:
+        return None
+    conn, seen = getattr(_local, "conn", None), getattr(_local, "key", None)
+    if conn is None or seen != (db_path, inode):
+        if conn is not None:
+            conn.close()
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        conn.row_factory = sqlite3.Row
+        _local.conn, _local.key = conn, (db_path, inode)
+    return conn
+
+
+def lookup(ids: Iterable[int], db_path: Optional[str] = None) -> Dict[int, Dict]:
+    """{id: row dict} for the ids present in the store ({} if there is no store)."""
+    wanted = [i for i in dict.fromkeys(ids) if isinstance(i, int)]
+    db_path = db_path or ITEM_DB_PATH
+    if wanted and _preloaded is not None:
+        try:
+            key = (db_path, os.stat(db_path).st_ino)
+        except OSError:
+            key = None
+        if key == _preloaded[0]:
+            rows = _preloaded[1]
+            return {i: rows[i] for i in wanted if i in rows}
+    conn = _connection(db_path) if wanted else None
+    if conn is None:
+        return {}
+    out: Dict[int, Dict] = {}
+    try:
+        for k in range(0, len(wanted), _BATCH):
+            chunk = wanted[k:k + _BATCH]
+            q = f"SELECT {', '.join(FIELDS)} FROM items WHERE id IN ({','.join('?' * len(chunk))})"
+            for row in conn.execute(q, chunk):
+                d = dict(row)
+                d["unique_equipped"] = bool(d["unique_equipped"])
+                out[d["id"]] = d
+    except sqlite3.Error:
+        return {}
+    return out
+
+
+def preload(db_path: Optional[str] = None) -> int:
+    """
+    Read the whole store into memory (warm workers do this once, before they
+    fork work horses, which then share it copy-on-write); later lookups
+    against the same file are served from memory. tooltip_html is not
+    loaded. Returns the row count, 0 if there is no store or it has more
+    than ITEM_PRELOAD_MAX_ROWS rows.
+    """
+    global _preloaded
+    db_path = db_path or ITEM_DB_PATH
+    conn = _connection(db_path)
+    if conn is None:
+        return 0
+    cols = [f for f in FIELDS if f != "tooltip_html"]
+    rows: Dict[int, Dict] = {}
+    try:
+        if conn.execute("SELECT COUNT(*) FROM items").fetchone()[0] > ITEM_PRELOAD_MAX_ROWS:
+            return 0
+        for row in conn.execute(f"SELECT {', '.join(cols)} FROM items"):
+            d = dict(row)
+            d["unique_equipped"] = bool(d["unique_equipped"])
+            d["tooltip_html"] = None
+            rows[d["id"]] = d
+        _preloaded = ((db_path, os.stat(db_path).st_ino), rows)
+    except (sqlite3.Error, OSError):
+        return 0
+    return len(rows)
+
+
+# ---- Bulk import ----
+def _read_dump(path: str) -> Iterator[Dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".csv"):
+            yield from csv.DictReader(f)
+            return
+        head = f.read(1)
+        f.seek(0)
+        if head == "[":
+            yield from json.load(f)
+            return
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _int(v) -> Optional[int]:
+    try:
+        return int(v) if v not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _row(d: Dict) -> Optional[tuple]:
+    item_id = _int(d.get("id"))
+    if item_id is None:
+        return None
+    unique = d.get("unique_equipped")
+    if isinstance(unique, str):
+        unique = unique.strip().lower() in ("1", "true", "yes")
+    return (item_id, d.get("name") or None, d.get("icon") or None, _int(d.get("ilvl")),
+            _int(d.get("quality")), int(bool(unique)), d.get("tooltip_html") or None)
+
+
+def import_dump(dump_path: str, db_path: Optional[str] = None, replace: bool = False) -> int:
+    """
+    Load a dump into the store and return the number of rows written. The new
+    file is built next to the old one and swapped in atomically, so readers
+    never see a half-written store. Without `replace`, existing rows are kept
+    unless the dump has the same id.
+    """
+    db_path = db_path or ITEM_DB_PATH
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(db_path)), suffix=".sqlite")
+    os.close(fd)
+    try:
+        conn = sqlite3.connect(tmp)
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute(_SCHEMA)
+        if not replace and os.path.exists(db_path):
+            conn.execute("ATTACH DATABASE ? AS old", (db_path,))
+            conn.execute("INSERT INTO items SELECT * FROM old.items")
+            conn.commit()
+            conn.execute("DETACH DATABASE old")
+        sql = f"INSERT OR REPLACE INTO items VALUES ({','.join('?' * len(FIELDS))})"
+        n = 0
+        batch: List[tuple] = []
+        for r in filter(None, map(_row, _read_dump(dump_path))):
+            batch.append(r)
+            if len(batch) >= 10_000:
+                conn.executemany(sql, batch)
+                n += len(batch)
+                batch.clear()
+        conn.executemany(sql, batch)
+        n += len(batch)
+        conn.commit()
+        conn.close()
+        os.replace(tmp, db_path)
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+    return n
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    ap = argparse.ArgumentParser(prog="python -m backend.item_store")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    imp = sub.add_parser("import", help="bulk-load a JSONL/JSON/CSV item dump")
+    imp.add_argument("dump")
+    imp.add_argument("--db", default=ITEM_DB_PATH)
+    imp.add_argument("--replace", action="store_true", help="drop items that are not in the dump")
+    args = ap.parse_args(argv)
+    n = import_dump(args.dump, args.db, replace=args.replace)
+    print(f"imported {n} items into {args.db}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+# backend/metrics.py
+from __future__ import annotations
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Dict, Iterator, Optional, Tuple
+
+from .queue_utils import get_redis
+
+# Stage timings and cache events are recorded where they happen (API process
+# or any worker) and summed in Redis, so /metrics on the web process covers
+# every worker. Each job also keeps its own record in job.meta["timings"].
+#
+#   queue_wait      enqueued -> picked up by a worker
+#   profileset_gen  building profileset input (API side)
+#   item_meta       item metadata lookups for unique-equipped checks
+#   simc            the simc subprocess, including waiting for cores
+#   simc_reported   SimC's own elapsed time from the json2 report
+#   read_back       loading json2, summarizing, storing artifacts
+#   serialize       result cache and profileset memo writes
+#   total           the job function, end to end
+BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH_INTERVAL", "5"))  # seconds between Redis writes
+
+_STAGES = "raidlocal:metrics:stages"  # hash: "<stage>|<le>", "<stage>|sum", "<stage>|count"
+_EVENTS = "raidlocal:metrics:events"  # hash: event -> count
+_HIT_RATIOS = {"result_cache": ("result_cache_hit", "result_cache_miss"),
+               "profileset_memo": ("memo_hit", "memo_miss"),
+               "shared_baseline": ("baseline_reused", "baseline_stored"),
+               "item_meta": (("item_meta_local", "item_meta_store", "item_meta_redis"),
+                             ("item_meta_remote", "item_meta_miss"))}
+
+_lock = threading.Lock()
+_pending: Dict[Tuple[str, str], float] = {}
+_last_flush = time.monotonic()
+_current: ContextVar[Optional[Dict[str, float]]] = ContextVar("raidlocal_timings", default=None)
+
+
+def _reset_after_fork() -> None:
+    # a forked work horse must not flush what its parent already buffered
+    global _lock
+    _lock = threading.Lock()
+    _pending.clear()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+# ---- Recording (best-effort; never raise) ----
+def _add(key: str, field: str, n: float) -> None:
+    with _lock:
+        _pending[(key, field)] = _pending.get((key, field), 0.0) + n
+    if time.monotonic() - _last_flush >= FLUSH_INTERVAL:
+        flush()
+
+
+def flush() -> None:
+    """Write buffered observations to Redis."""
+    global _last_flush
+    with _lock:
+        todo = dict(_pending)
+        _pending.clear()
+        _last_flush = time.monotonic()
+    if not todo:
+        return
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for (key, field), n in todo.items():
+            pipe.hincrbyfloat(key, field, n)
+        pipe.execute()
+    except Exception:
+        pass
+
+
+def incr(event: str, n: float = 1) -> None:
+    if n:
+        _add(_EVENTS, event, n)
+
+
+def observe(stage: str, seconds: float) -> None:
+    for le in BUCKETS:
+        if seconds <= le:
+            _add(_STAGES, f"{stage}|{le:g}", 1)
+    _add(_STAGES, f"{stage}|sum", seconds)
+    _add(_STAGES, f"{stage}|count", 1)
+
+
+def record(stage: str, seconds: float) -> None:
+    """Add time to the current job's record, or observe it directly outside one."""
+    rec = _current.get()
+    if rec is None:
+        observe(stage, seconds)
+    else:
+        rec[stage] = rec.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    t = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - t)
+
+
+@contextmanager
+def timings() -> Iterator[Dict[str, float]]:
+    """
+    Collect stage times of one request or job into a dict; each stage is
+    observed once, with its total, when the outermost block ends.
+    """
+    rec = _current.get()
+    if rec is not None:
+        yield rec
+        return
+    rec = {}
+    token = _current.set(rec)
+    try:
+        yield rec
+    finally:
+        _current.reset(token)
+        for name, seconds in rec.items():
+            observe(name, seconds)
+
+
+def current() -> Optional[Dict[str, float]]:
+    return _current.get()
+
+
+def rounded(rec: Dict[str, float]) -> Dict[str, float]:
+    return {k: round(v, 4) for k, v in rec.items()}
+
+
+def timed_job(fn):
+    """
+    RQ job functions: time the whole job (plus queue wait), store the record in job.meta["timings"] next to what the API recorded at
+    enqueue time, and flush. Nested job functions share the outer record.
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        if _current.get() is not None:
+            return fn(*args, **kwargs)
+        from rq import get_current_job
+
+        job = get_current_job()
+        t0 = time.perf_counter()
+        ok = False
+        try:
+            with timings() as rec:
+                if job is not None and job.enqueued_at and job.started_at:
+                    rec["queue_wait"] = max(0.0, (job.started_at - job.enqueued_at).total_seconds())
+                try:
+                    result = fn(*args, **kwargs)
+                    ok = True
+                    return result
+                finally:
+                    rec["total"] = time.perf_counter() - t0
+                    incr("jobs_finished" if ok else "jobs_failed")
+                    _save(job, rec)
+        finally:
+            flush()
+    return wrapper
+
+
+def _save(job, rec: Dict[str, float]) -> None:
+    if job is None:
+        return
+    try:
+        job.meta["timings"] = {**(job.meta.get("timings") or {}), **rounded(rec)}
+        job.save_meta()
+    except Exception:
+        pass
+
+
+def result_bytes(job_id: str, connection=None) -> Optional[int]:
+    """
+    Size of the result RQ stored for a finished job: the latest entry of its
+    results stream, or the job hash's `result` field on Redis without
+    streams. None if there is none (yet). Read on demand, never per job.
+    """
+    conn = connection or get_redis()
+    try:
+        entries = conn.xrevrange(f"rq:results:{job_id}", count=1)
+        if entries:
+            value = entries[0][1].get(b"return_value")
+            return len(value) if value is not None else None
+        return conn.hstrlen(f"rq:job:{job_id}", "result") or None
+    except Exception:
+        return None
+
+
+def simc_elapsed(data: Dict) -> Optional[float]:
+    """SimC's own wall time from a json2 report, if it has one."""
+    stats = (data.get("sim") or {}).get("statistics") or {}
+    value = stats.get("elapsed_time_seconds")
+    return float(value) if isinstance(value, (int, float)) else None
+
+
+# ---- Exposition ----
+def _floats(raw: Dict[bytes, bytes]) -> Dict[str, float]:
+    return {k.decode(): float(v) for k, v in raw.items()}
+
+
+class _Collector:
+    """Reads the shared aggregates plus queue, worker and core state at scrape time."""
+
+    def collect(self):
+        from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, HistogramMetricFamily
+        from rq import Worker
+        from rq.registry import DeferredJobRegistry, FailedJobRegistry, ScheduledJobRegistry, StartedJobRegistry
+
+        from . import cpu_budget, nodes, scheduling
+        from .queue_utils import get_queue
+
+        r = get_redis()
+        stages = _floats(r.hgetall(_STAGES))
+        hist = HistogramMetricFamily("raidlocal_job_stage_seconds", "Time spent per job stage.", labels=["stage"])
+        for name in sorted({k.split("|", 1)[0] for k in stages}):
+            count = stages.get(f"{name}|count", 0.0)
+            buckets = [(f"{le:g}", stages.get(f"{name}|{le:g}", 0.0)) for le in BUCKETS] + [("+Inf", count)]
+            hist.add_metric([name], buckets, stages.get(f"{name}|sum", 0.0))
+        yield hist
+
+        events = _floats(r.hgetall(_EVENTS))
+        counter = CounterMetricFamily("raidlocal_events", "Job outcomes and cache lookups.", labels=["event"])
+        for name, n in sorted(events.items()):
+            counter.add_metric([name], n)
+        yield counter
+
+        ratio = GaugeMetricFamily("raidlocal_cache_hit_ratio", "Hits / lookups since the counters started.",
+                                  labels=["cache"])
+        for cache, (hits, misses) in _HIT_RATIOS.items():
+            hits = (hits,) if isinstance(hits, str) else hits
+            misses = (misses,) if isinstance(misses, str) else misses
+            h = sum(events.get(e, 0.0) for e in hits)
+            total = h + sum(events.get(e, 0.0) for e in misses)
+            if total:
+                ratio.add_metric([cache], h / total)
+        yield ratio
+
+        depth = GaugeMetricFamily("raidlocal_queue_jobs", "Jobs per queue and state.", labels=["queue", "state"])
+        for name in scheduling.QUEUES:
+            q = get_queue(name)
+            depth.add_metric([name, "queued"], q.count)
+            for state, registry in (("started", StartedJobRegistry), ("deferred", DeferredJobRegistry),
+                                    ("scheduled", ScheduledJobRegistry), ("failed", FailedJobRegistry)):
+                depth.add_metric([name, state], registry(queue=q).count)
+        yield depth
+
+        state = scheduling.queue_state()["queues"]
+        eta = GaugeMetricFamily("raidlocal_queue_eta_seconds", "Estimated wait before a new job on the queue starts.",
+                                labels=["queue"])
+        left = GaugeMetricFamily("raidlocal_queue_core_seconds", "Estimated simc core-seconds of outstanding work.",
+                                 labels=["queue"])
+        for name, q in state.items():
+            eta.add_metric([name], q["eta_seconds"])
+            left.add_metric([name], q["core_seconds"])
+        yield eta
+        yield left
+        rate = GaugeMetricFamily("raidlocal_core_seconds_per_cost", "Calibrated simc core-seconds per cost unit.",
+                                 labels=["precision"])
+        for mode in ("iterations", "target_error", "default"):
+            rate.add_metric([mode], scheduling.core_seconds_per_cost(mode))
+        yield rate
+
+        workers = Worker.all(connection=r)
+        states: Dict[str, int] = {}
+        for w in workers:
+            s = w.get_state()
+            states[s] = states.get(s, 0) + 1
+        by_state = GaugeMetricFamily("raidlocal_workers", "RQ workers by state.", labels=["state"])
+        for s, n in sorted(states.items()):
+            by_state.add_metric([s], n)
+        yield by_state
+        yield GaugeMetricFamily("raidlocal_worker_utilization", "Share of RQ workers running a job.",
+                                value=states.get("busy", 0) / len(workers) if workers else 0.0)
+
+        node_cores = GaugeMetricFamily("raidlocal_node_cores", "Cores of each live sim node.", labels=["node"])
+        node_workers = GaugeMetricFamily("raidlocal_node_workers", "Live worker processes per sim node.",
+                                         labels=["node"])
+        for n in nodes.summary(r):
+            node_cores.add_metric([n["node"]], n["cores"])
+            node_workers.add_metric([n["node"]], n["workers"])
+        yield node_cores
+        yield node_workers
+
+        threads = GaugeMetricFamily("raidlocal_simc_threads_leased", "SimC threads leased per host.", labels=["host"])
+        for host, n in sorted(cpu_budget.usage().items()):
+            threads.add_metric([host], n)
+        yield threads
+
+
+def render() -> Tuple[bytes, str]:
+    """Prometheus text exposition: (body, content type)."""
+    from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, generate_latest
+
+    flush()
+    registry = CollectorRegistry(auto_describe=False)
+    registry.register(_Collector())
+    return generate_latest(registry), CONTENT_TYPE_LATEST
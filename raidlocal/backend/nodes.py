@@ -0,0 +1,169 @@
+# backend/nodes.py
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from . import cpu_budget, metrics, scheduling
+from .queue_utils import _new_client, get_redis
+
+# Sim nodes are boxes running `rq worker[-pool] -w backend.worker.NodeWorker`
+# against the central Redis. Every worker process advertises itself (node,
+# cores, simc build, queues) under a key its heartbeat keeps alive, and pulls
+# jobs (whole runs or shards) from the queues like any RQ worker. When a
+# worker stops heartbeating, the jobs it had started go back to the front of
+# their queue (at most NODE_MAX_REQUEUES times), so a lost box only costs the
+# time its jobs had run.
+NODE_ID = os.environ.get("SIMC_NODE_ID") or cpu_budget.HOST_ID
+HEARTBEAT = float(os.environ.get("SIMC_NODE_HEARTBEAT", "10"))
+NODE_TTL = int(os.environ.get("SIMC_NODE_TTL") or max(3, int(HEARTBEAT * 3)))
+MAX_REQUEUES = int(os.environ.get("SIMC_NODE_MAX_REQUEUES", "2"))
+# Profileset runs with no explicit shard count are split across the live
+# worker processes serving their queue, but never below this many profilesets
+# per shard (each shard sims its own baseline)
+SHARD_MIN_PROFILESETS = int(os.environ.get("SIMC_SHARD_MIN_PROFILESETS", "200"))
+
+_KEY = "raidlocal:node:"              # worker name -> json info; expires without heartbeats
+_WORKERS = "raidlocal:node_workers"   # set of every registered worker name
+_REAPER = "raidlocal:node_reaper"     # one reaper per heartbeat period
+
+
+# ---- Registry ----
+def advertise(worker_name: str, queues: List[str]) -> Dict:
+    from .simc_runner import simc_version
+
+    return {"worker": worker_name, "node": NODE_ID, "host": cpu_budget.HOST_ID, "cores": cpu_budget.CORES,
+            "max_job_threads": cpu_budget.MAX_JOB_THREADS, "simc": simc_version(),
+            "queues": list(queues), "since": int(time.time())}
+
+
+def beat(conn, info: Dict) -> None:
+    """Register (or keep registered) one worker process."""
+    with conn.pipeline() as p:
+        p.set(_KEY + info["worker"], json.dumps(info), ex=NODE_TTL)
+        p.sadd(_WORKERS, info["worker"])
+        p.execute()
+
+
+def unregister(conn, worker_name: str) -> None:
+    with conn.pipeline() as p:
+        p.delete(_KEY + worker_name)
+        p.srem(_WORKERS, worker_name)
+        p.execute()
+
+
+def live_workers(conn=None) -> List[Dict]:
+    conn = conn or get_redis()
+    names = sorted(n.decode() for n in conn.smembers(_WORKERS))
+    if not names:
+        return []
+    return [json.loads(raw) for raw in conn.mget([_KEY + n for n in names]) if raw is not None]
+
+
+def summary(conn=None) -> List[Dict]:
+    """
+    Live nodes: {"node", "host", "cores", "simc", "workers", "queues"}, one per
+    node id. Nodes with different ids on one core budget (same SIMC_HOST_ID)
+    share `cores`; see scheduling.capacities.
+    """
+    out: Dict[str, Dict] = {}
+    for w in live_workers(conn):
+        n = out.setdefault(w["node"], {"node": w["node"], "host": w.get("host", w["node"]), "cores": w["cores"],
+                                        "simc": w["simc"], "workers": 0, "queues": []})
+        n["workers"] += 1
+        n["queues"] = sorted(set(n["queues"]) | set(w["queues"]))
+    return sorted(out.values(), key=lambda n: n["node"])
+
+
+def auto_shards(profilesets: int, queue: str) -> int:
+    """Shards for a run of `profilesets` on `queue`: one per live worker serving it, within limits."""
+    if profilesets < 2 * SHARD_MIN_PROFILESETS:
+        return 1
+    try:
+        slots = sum(1 for w in live_workers() if queue in w["queues"])
+    except Exception:
+        return 1
+    return max(1, min(slots, profilesets // SHARD_MIN_PROFILESETS))
+
+
+# ---- Lost workers ----
+def reap(conn=None) -> List[str]:
+    """
+    Put the started jobs of workers that stopped heartbeating back on their
+    queue (or fail them after MAX_REQUEUES tries). Returns the requeued ids.
+    """
+    from rq.job import Job, JobStatus
+    from rq.queue import Queue
+    from rq.registry import FailedJobRegistry, StartedJobRegistry
+
+    conn = conn or get_redis()
+    if not conn.set(_REAPER, NODE_ID, nx=True, ex=max(1, int(HEARTBEAT))):
+        return []
+    names = [n.decode() for n in conn.smembers(_WORKERS)]
+    alive = conn.mget([_KEY + n for n in names]) if names else []
+    dead = {n for n, raw in zip(names, alive) if raw is None}
+    if not dead:
+        return []
+    requeued: List[str] = []
+    for name in scheduling.QUEUES:
+        q = Queue(name, connection=conn)
+        started = StartedJobRegistry(queue=q)
+        for job in Job.fetch_many(started.get_job_ids(), connection=conn):
+            if job is None or job.worker_name not in dead:
+                continue
+            started.remove(job)
+            tries = job.meta.get("requeues", 0) + 1
+            job.meta["requeues"] = tries
+            job.save_meta()
+            if tries > MAX_REQUEUES:
+                job.set_status(JobStatus.FAILED)
+                FailedJobRegistry(queue=q).add(job, exc_string=f"lost its worker {tries} times ({job.worker_name})",
+                                               _save_exc_to_job=True)
+                q.enqueue_dependents(job)
+                metrics.incr("jobs_failed")
+                continue
+            q.enqueue_job(job, at_front=True)
+            requeued.append(job.id)
+    conn.srem(_WORKERS, *dead)
+    metrics.incr("jobs_requeued", len(requeued))
+    metrics.flush()
+    return requeued
+
+
+class Heartbeat:
+    """
+    Keeps a worker process registered and reaps lost ones, from a thread of
+    the worker's main process (horses are forked from it). Uses a Redis
+    client of its own, so forking never copies a pool this thread holds.
+    """
+
+    def __init__(self, worker_name: str, queues: List[str]):
+        self.info = advertise(worker_name, queues)
+        self.conn = _new_client()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(HEARTBEAT):
+            try:
+                beat(self.conn, self.info)
+                reap(self.conn)
+            except Exception:
+                pass
+
+    def start(self) -> None:
+        beat(self.conn, self.info)
+        self._thread = threading.Thread(target=self._run, name="node-heartbeat", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        try:
+            unregister(self.conn, self.info["worker"])
+        except Exception:
+            pass
@@ -0,0 +1,144 @@
+# backend/progress.py
+from __future__ import annotations
+
+import json
+import pickle
+import re
+import time
+from typing import AsyncIterator, Dict, List, Optional
+
+from .queue_utils import get_async_redis, get_redis
+
+# Workers publish job events on a per-job channel; /api/job/{id}/events
+# forwards them to the browser as server-sent events.
+_CHANNEL = "raidlocal:events:"
+TERMINAL = ("finished", "failed", "stopped", "canceled")
+
+# ---- SimC stdout parsing ----
+_BAR = re.compile(r"\[[=>.\s]*\]\s*(\d+)/(\d+)")
+_PROFILESET = re.compile(r"[Pp]rofilesets?\s*\((\d+)/(\d+)\)")
+
+
+def parse_progress(line: str) -> Optional[Dict]:
+    """
+    Parse one SimC progress-bar line, e.g.
+      "Generating Baseline: Fury [=====>......] 1200/5000 ..."
+      "Profilesets (12/190): T_1_VS_2 [==>........] 300/1000 ..."
+    into {"phase", "current", "total", "profileset", "profilesets", "pct"}.
+    """
+    bar = _BAR.search(line)
+    if not bar:
+        return None
+    cur, total = int(bar.group(1)), int(bar.group(2))
+    frac = cur / total if total else 0.0
+    ps = _PROFILESET.search(line)
+    if ps:
+        k, n = int(ps.group(1)), int(ps.group(2))
+        pct = ((max(k, 1) - 1) + frac) / n if n else frac
+        return {"phase": "profilesets", "current": cur, "total": total,
+                "profileset": k, "profilesets": n, "pct": round(100 * pct, 1)}
+    phase = "baseline" if "aseline" in line else "sim"
+    return {"phase": phase, "current": cur, "total": total, "pct": round(100 * frac, 1)}
+
+
+def compact_rows(rows: List[Dict]) -> List[Dict]:
+    """The fields of profileset rows the UI needs for a partial table."""
+    return [{"name": r.get("name"), "mean": r.get("mean"), "mean_error": r.get("mean_error"),
+             "cached": bool(r.get("cached"))} for r in rows]
+
+
+# ---- Worker side (best-effort; never raise) ----
+def _current_job():
+    try:
+        from rq import get_current_job
+        return get_current_job()
+    except Exception:
+        return None
+
+
+class JobReporter:
+    """
+    Publishes events for the RQ job running in this process (no-op outside a
+    worker). Progress is throttled; sharded child jobs report on their
+    parent's channel (job.meta["events_to"]).
+    """
+
+    def __init__(self, min_interval: float = 0.5):
+        self.job = _current_job()
+        self.channel = None
+        if self.job is not None:
+            self.channel = _CHANNEL + (self.job.meta.get("events_to") or self.job.id)
+        self.min_interval = min_interval
+        self._last = 0.0
+        self._last_phase = None
+
+    def publish(self, event: Dict) -> None:
+        if not self.channel:
+            return
+        try:
+            get_redis().publish(self.channel, json.dumps({**event, "source": self.job.id}))
+        except Exception:
+            pass
+
+    def progress(self, info: Dict) -> None:
+        now = time.monotonic()
+        if info.get("phase") == self._last_phase and now - self._last < self.min_interval:
+            return
+        self._last, self._last_phase = now, info.get("phase")
+        self.publish({"type": "progress", **info})
+        try:
+            self.job.meta["progress"] = info
+            self.job.save_meta()
+        except Exception:
+            pass
+
+    def rows(self, rows: List[Dict]) -> None:
+        if rows:
+            self.publish({"type": "rows", "rows": compact_rows(rows)})
+
+
+# ---- API side ----
+def _sse(event: Dict) -> str:
+    return f"data: {json.dumps(event)}\n\n"
+
+
+async def stream(job_id: str) -> AsyncIterator[str]:
+    """Server-sent events for one job: status changes, progress and partial rows."""
+    r = get_async_redis()
+    pubsub = r.pubsub()
+    try:
+        # subscribe before the first status read so nothing falls in between
+        await pubsub.subscribe(_CHANNEL + job_id)
+        key = f"rq:job:{job_id}"
+        raw_meta = await r.hget(key, "meta")
+        if raw_meta:
+            try:
+                meta = pickle.loads(raw_meta)
+                # rows known at enqueue time (memoized profilesets)
+                if meta.get("rows"):
+                    yield _sse({"type": "rows", "rows": meta["rows"]})
+                if meta.get("progress"):
+                    yield _sse({"type": "progress", **meta["progress"]})
+            except Exception:
+                pass
+        last = None
+        while True:
+            raw = await r.hget(key, "status")
+            if raw is None:
+                yield _sse({"type": "status", "status": "missing"})
+                return
+            status = raw.decode()
+            if status != last:
+                last = status
+                yield _sse({"type": "status", "status": status})
+            if status in TERMINAL:
+                # flush what the job published right before it ended
+                while (msg := await pubsub.get_message(ignore_subscribe_messages=True, timeout=0)):
+                    if msg.get("type") == "message":
+                        yield f"data: {msg['data'].decode()}\n\n"
+                return
+            msg = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            if msg and msg.get("type") == "message":
+                yield f"data: {msg['data'].decode()}\n\n"
+    finally:
+        await pubsub.aclose()
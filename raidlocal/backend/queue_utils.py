@@ -1,9 +1,104 @@
+import asyncio
 import os
+import threading
+import weakref
+from typing import Dict, List, Optional
+
 from rq import Queue
-from redis import Redis
+from redis import BlockingConnectionPool, Redis
+
+# One connection pool per process, shared by every endpoint, queue and helper.
+# Connections are health-checked when they have been idle, and callers wait
+# (up to REDIS_POOL_TIMEOUT seconds) for a free one instead of opening more
+# than REDIS_POOL_SIZE. redis-py resets the pool in forked work horses.
+REDIS_POOL_SIZE = int(os.environ.get("REDIS_POOL_SIZE", "50"))
+REDIS_POOL_TIMEOUT = float(os.environ.get("REDIS_POOL_TIMEOUT", "5"))
+REDIS_HEALTH_CHECK_INTERVAL = int(os.environ.get("REDIS_HEALTH_CHECK_INTERVAL", "30"))
+
+FAKE_URL = "fakeredis://"
+
+_lock = threading.RLock()
+_client: Optional[Redis] = None
+_queues: Dict[str, Queue] = {}
+_fake = None
+_async_clients: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+os.register_at_fork(after_in_child=_async_clients.clear)
+
 
 def get_redis_url() -> str:
     return os.environ.get("REDIS_URL", "redis://localhost:6379/0")
 
+
+def _pool_options() -> dict:
+    return {"health_check_interval": REDIS_HEALTH_CHECK_INTERVAL, "socket_keepalive": True,
+            "socket_connect_timeout": 5}
+
+
+def _fake_server():
+    # REDIS_URL=fakeredis:// keeps everything in this process (benchmarks, offline
+    # runs); sync and asyncio clients share one in-memory server
+    global _fake
+    import fakeredis
+    with _lock:
+        if _fake is None:
+            _fake = fakeredis.FakeServer()
+    return _fake
+
+
+def _new_client() -> Redis:
+    if get_redis_url().startswith(FAKE_URL):
+        import fakeredis
+        return fakeredis.FakeRedis(server=_fake_server())
+    pool = BlockingConnectionPool.from_url(get_redis_url(), max_connections=REDIS_POOL_SIZE,
+                                           timeout=REDIS_POOL_TIMEOUT, **_pool_options())
+    return Redis(connection_pool=pool)
+
+
+def get_redis() -> Redis:
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = _new_client()
+    return _client
+
+
 def get_queue(name: str = "simc") -> Queue:
-    return Queue(name, connection=Redis.from_url(get_redis_url()))
+    q = _queues.get(name)
+    if q is None:
+        q = _queues.setdefault(name, Queue(name, connection=get_redis()))
+    return q
+
+
+def get_async_redis():
+    """Shared asyncio client for the running event loop (SSE streams, item cache)."""
+    from redis.asyncio import Redis as AsyncRedis
+
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None and get_redis_url().startswith(FAKE_URL):
+        import fakeredis
+        client = _async_clients[loop] = fakeredis.FakeAsyncRedis(server=_fake_server())
+    if client is None:
+        # not capped: every open SSE stream holds a pub/sub connection
+        client = _async_clients[loop] = AsyncRedis.from_url(get_redis_url(), **_pool_options())
+    return client
+
+
+async def close_async_redis() -> None:
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+def job_statuses(job_ids: List[str]) -> Dict[str, Optional[str]]:
+    """Status of RQ jobs read from their hashes alone (None if unknown); no pickled data is loaded."""
+    pipe = get_redis().pipeline(transaction=False)
+    for job_id in job_ids:
+        pipe.hget(f"rq:job:{job_id}", "status")
+    return {j: (raw.decode() if raw is not None else None) for j, raw in zip(job_ids, pipe.execute())}
+
+
+def job_status(job_id: str) -> Optional[str]:
+    raw = get_redis().hget(f"rq:job:{job_id}", "status")
+    return raw.decode() if raw is not None else None
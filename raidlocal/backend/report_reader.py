@@ -0,0 +1,96 @@
+# backend/report_reader.py
+from __future__ import annotations
+
+import json
+import os
+from typing import Dict, Iterable, Tuple
+
+# A SimC json2 report carries every player's full collected data (timelines,
+# action stats, buffs) and runs to tens of MB for big profileset runs. Jobs
+# only need the baseline numbers and the profileset rows, so the report is
+# streamed and just those parts are kept, in the original json2 shape. The
+# full report stays available as the json artifact.
+try:
+    import ijson  # type: ignore
+except Exception:  # pragma: no cover
+    ijson = None  # type: ignore
+
+# Smaller reports are json.load-ed (faster; the streaming parser pays per
+# token) and slimmed right away.
+STREAM_MIN_BYTES = int(float(os.environ.get("SIMC_STREAM_JSON_MIN_MB", "16")) * 1024 * 1024)
+
+# first occurrence of each prefix is kept (i.e. the first player's numbers)
+KEEP = ("version", "sim.statistics", "sim.players.item.name", "sim.players.item.collected_data.dps",
+        "sim.profilesets")
+
+_OPEN = ("start_map", "start_array")
+_CLOSE = ("end_map", "end_array")
+
+
+def _capture(events: Iterable[Tuple[str, str, object]]) -> Dict[str, object]:
+    """{prefix: value} for the KEEP prefixes, built from ijson parse events."""
+    found: Dict[str, object] = {}
+    it = iter(events)
+    for prefix, event, value in it:
+        if prefix not in KEEP or prefix in found or event == "map_key" or event in _CLOSE:
+            continue
+        if event not in _OPEN:
+            found[prefix] = value
+            continue
+        builder = ijson.ObjectBuilder()
+        builder.event(event, value)
+        depth = 1
+        for _, ev, val in it:
+            builder.event(ev, val)
+            if ev in _OPEN:
+                depth += 1
+            elif ev in _CLOSE:
+                depth -= 1
+                if not depth:
+                    break
+        found[prefix] = builder.value
+    return found
+
+
+def _assemble(found: Dict[str, object]) -> Dict:
+    sim: Dict = {}
+    if "sim.statistics" in found:
+        sim["statistics"] = found["sim.statistics"]
+    if "sim.players.item.name" in found or "sim.players.item.collected_data.dps" in found:
+        player: Dict = {"name": found.get("sim.players.item.name")}
+        if "sim.players.item.collected_data.dps" in found:
+            player["collected_data"] = {"dps": found["sim.players.item.collected_data.dps"]}
+        sim["players"] = [player]
+    if "sim.profilesets" in found:
+        sim["profilesets"] = found["sim.profilesets"]
+    out: Dict = {"sim": sim} if sim else {}
+    if "version" in found:
+        out["version"] = found["version"]
+    return out
+
+
+def slim(data: Dict) -> Dict:
+    """The parts of an already loaded json2 report that read_report keeps."""
+    found: Dict[str, object] = {}
+    sim = (data or {}).get("sim") or {}
+    players = sim.get("players") or []
+    p = players[0] if players else None
+    for key, value in (("version", (data or {}).get("version")), ("sim.statistics", sim.get("statistics")),
+                       ("sim.players.item.name", p.get("name") if p else None),
+                       ("sim.players.item.collected_data.dps", ((p or {}).get("collected_data") or {}).get("dps")),
+                       ("sim.profilesets", sim.get("profilesets"))):
+        if value is not None:
+            found[key] = value
+    return _assemble(found)
+
+
+def read_report(path: str) -> Dict:
+    """
+    Baseline and profileset parts of the json2 report at `path`. Reports of
+    STREAM_MIN_BYTES and up are read incrementally, so memory stays
+    proportional to what is kept (needs ijson; otherwise json.load).
+    """
+    with open(path, "rb") as f:
+        if ijson is None or os.path.getsize(path) < STREAM_MIN_BYTES:
+            return slim(json.load(f))
+        return _assemble(_capture(ijson.parse(f, use_float=True)))
@@ -0,0 +1,217 @@
+# backend/result_cache.py
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+from . import metrics
+from .queue_utils import get_redis
+
+# ---- Settings ----
+CACHE_ENABLED = os.environ.get("SIMC_CACHE", "1") != "0"
+CACHE_TTL = int(os.environ.get("SIMC_CACHE_TTL", str(60 * 60 * 24)))  # 24 hours
+CACHE_MAX_ENTRIES = int(os.environ.get("SIMC_CACHE_MAX_ENTRIES", "200"))
+
+_PREFIX = "raidlocal:simcache:"
+_LRU = _PREFIX + "lru"  # zset: cache key -> last access time
+_MEMO = "raidlocal:psmemo:"  # hash per base actor+settings: profileset field -> row
+_MEMO_BASELINE = "__baseline__"
+
+# Job ids handed out for cache hits; job_status resolves these from the cache
+CACHED_JOB_PREFIX = "cached-"
+
+
+# ---- Keys ----
+def normalize_simc_text(simc_text: str) -> str:
+    """
+    Canonical form of a SimC input for hashing: comments, blank lines and
+    surrounding whitespace don't change the sim, so they don't change the key.
+    """
+    lines = []
+    for line in (simc_text or "").splitlines():
+        s = line.strip()
+        if not s or s.startswith("#"):
+            continue
+        lines.append(s)
+    return "\n".join(lines)
+
+
+def normalize_args(extra_args: Optional[List[str]]) -> List[str]:
+    """
+    Canonical form of SimC command-line args: the last `key=value` of each
+    option wins in SimC, so only that one is kept and the options are sorted.
+    `+=` appends and bare args keep their order.
+    """
+    opts, rest = {}, []
+    for a in extra_args or []:
+        a = a.strip()
+        key, sep, value = a.partition("=")
+        if not a:
+            continue
+        if sep and not key.endswith("+"):
+            opts[key.strip()] = f"{key.strip()}={value.strip()}"
+        else:
+            rest.append(a)
+    return sorted(opts.values()) + rest
+
+
+def cache_key(simc_text: str, extra_args: Optional[List[str]], simc_version: str) -> str:
+    h = hashlib.sha256()
+    h.update(normalize_simc_text(simc_text).encode("utf-8"))
+    h.update(b"\0")
+    h.update("\n".join(normalize_args(extra_args)).encode("utf-8"))
+    h.update(b"\0")
+    h.update((simc_version or "").encode("utf-8"))
+    return h.hexdigest()
+
+
+# ---- Store (best-effort; never raise) ----
+def touch(key: str) -> bool:
+    """True if `key` is cached; also marks it as recently used."""
+    if not CACHE_ENABLED:
+        return False
+    try:
+        r = get_redis()
+        if not r.exists(_PREFIX + key):
+            metrics.incr("result_cache_miss")
+            return False
+        r.zadd(_LRU, {key: time.time()})
+        metrics.incr("result_cache_hit")
+        return True
+    except Exception:
+        return False
+
+
+def get(key: str) -> Optional[Dict]:
+    if not CACHE_ENABLED:
+        return None
+    try:
+        r = get_redis()
+        raw = r.get(_PREFIX + key)
+        if raw is None:
+            return None
+        r.zadd(_LRU, {key: time.time()})
+        return json.loads(zlib.decompress(raw))
+    except Exception:
+        return None
+
+
+def put(key: str, result: Dict) -> None:
+    if not CACHE_ENABLED:
+        return
+    try:
+        r = get_redis()
+        now = time.time()
+        blob = zlib.compress(json.dumps(result, separators=(",", ":")).encode("utf-8"))
+        with r.pipeline() as p:
+            p.set(_PREFIX + key, blob, ex=CACHE_TTL)
+            p.zadd(_LRU, {key: now})
+            # entries whose TTL already ran out
+            p.zremrangebyscore(_LRU, "-inf", now - CACHE_TTL)
+            p.zcard(_LRU)
+            size = p.execute()[-1]
+        if size > CACHE_MAX_ENTRIES:
+            # evict least recently used
+            victims = r.zrange(_LRU, 0, size - CACHE_MAX_ENTRIES - 1)
+            if victims:
+                with r.pipeline() as p:
+                    p.delete(*[_PREFIX + v.decode() for v in victims])
+                    p.zrem(_LRU, *victims)
+                    p.execute()
+    except Exception:
+        pass
+
+
+# ---- Per-profileset memo ----
+# Rows of finished profileset runs are kept per base actor + sim settings
+# (`cache_key(base_profile, extra_args, version)`), so a later run with the
+# same base only has to sim the profilesets it hasn't seen yet.
+#
+# The baseline is shared the same way: the first run of a base stores its
+# baseline and every later run or shard of that base reports (and computes
+# deltas against) that one, so split and incremental runs stay consistent.
+_PAIRED_SLOT = re.compile(r"^\s*(trinket|finger)[12]\s*=")
+
+
+def profileset_field(overrides: List[str]) -> str:
+    """Order-independent key of a profileset's gear (trinket1/2 and finger1/2 are interchangeable)."""
+    norm = sorted(_PAIRED_SLOT.sub(lambda m: m.group(1) + "=", o.strip()) for o in overrides)
+    return hashlib.sha1("\n".join(norm).encode("utf-8")).hexdigest()
+
+
+def memo_lookup(base_key: str, fields: Dict[str, str]) -> Tuple[Optional[Dict], Dict[str, Dict]]:
+    """
+    fields: {profileset name: profileset_field(...)}
+    Returns (baseline json, {profileset name: cached row}); nothing is
+    reported as cached unless the baseline is too.
+    """
+    if not CACHE_ENABLED or not fields:
+        return None, {}
+    try:
+        names = list(fields)
+        raw = get_redis().hmget(_MEMO + base_key, [_MEMO_BASELINE] + [fields[n] for n in names])
+        if raw[0] is None:
+            metrics.incr("memo_miss", len(names))
+            return None, {}
+        baseline = json.loads(zlib.decompress(raw[0]))
+        rows = {}
+        for name, blob in zip(names, raw[1:]):
+            if blob is not None:
+                rows[name] = {**json.loads(blob), "name": name}
+        metrics.incr("memo_hit", len(rows))
+        metrics.incr("memo_miss", len(names) - len(rows))
+        return baseline, rows
+    except Exception:
+        return None, {}
+
+
+def shared_baseline(base_key: str) -> Optional[Dict]:
+    """The baseline json shared by every run of this base + settings, if there is one yet."""
+    if not CACHE_ENABLED:
+        return None
+    try:
+        raw = get_redis().hget(_MEMO + base_key, _MEMO_BASELINE)
+        return json.loads(zlib.decompress(raw)) if raw is not None else None
+    except Exception:
+        return None
+
+
+def memo_store(base_key: str, fields: Dict[str, str], result_json: Dict,
+               replace_baseline: bool = False) -> Optional[Dict]:
+    """
+    Remember every profileset row of a finished run, and its baseline unless
+    this base already has one (or `replace_baseline`, for forced re-sims).
+    Returns the shared baseline json.
+    """
+    if not CACHE_ENABLED:
+        return None
+    try:
+        sim = result_json.get("sim") or {}
+        rows = (sim.get("profilesets") or {}).get("results") or []
+        baseline = {**result_json, "sim": {k: v for k, v in sim.items() if k != "profilesets"}}
+        blob = zlib.compress(json.dumps(baseline, separators=(",", ":")).encode("utf-8"))
+        mapping = {}
+        for row in rows:
+            field = fields.get(row.get("name"))
+            if field and not row.get("cached"):
+                mapping[field] = json.dumps(row, separators=(",", ":"))
+        key = _MEMO + base_key
+        with get_redis().pipeline() as p:
+            if replace_baseline:
+                p.hset(key, _MEMO_BASELINE, blob)
+            else:
+                p.hsetnx(key, _MEMO_BASELINE, blob)
+            if mapping:
+                p.hset(key, mapping=mapping)
+            p.expire(key, CACHE_TTL)
+            p.hget(key, _MEMO_BASELINE)
+            out = p.execute()
+        metrics.incr("baseline_stored" if replace_baseline or out[0] else "baseline_reused")
+        return json.loads(zlib.decompress(out[-1])) if out[-1] is not None else baseline
+    except Exception:
+        return None
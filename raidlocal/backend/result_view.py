@@ -0,0 +1,81 @@
+# backend/result_view.py
+from __future__ import annotations
+
+import math
+from typing import Dict, List, Optional
+
+# Compact, columnar projection of a SimC json2 report: the baseline numbers
+# plus one column per profileset field. It is stored with every job result so
+# the API can rank, page and diff rows without shipping the full report.
+COLUMNS = ("name", "mean", "error", "stage", "cached")
+SORT_KEYS = ("mean", "name", "error", "delta")
+
+
+def _num(v) -> Optional[float]:
+    return v if isinstance(v, (int, float)) and not (isinstance(v, float) and math.isnan(v)) else None
+
+
+def summarize(data: Dict) -> Dict:
+    sim = (data or {}).get("sim") or {}
+    players = sim.get("players") or []
+    p = players[0] if players else {}
+    dps = (p.get("collected_data") or {}).get("dps") or {}
+    ps = sim.get("profilesets") or {}
+    cols: Dict[str, List] = {c: [] for c in COLUMNS}
+    for r in ps.get("results") or []:
+        cols["name"].append(r.get("name"))
+        cols["mean"].append(_num(r.get("mean")))
+        cols["error"].append(_num(r.get("mean_error")) or (2 * r["mean_stddev"] if _num(r.get("mean_stddev")) else None))
+        cols["stage"].append(r.get("stage"))
+        cols["cached"].append(bool(r.get("cached")))
+    mean_std = _num(dps.get("mean_std_dev"))
+    return {
+        "baseline": {
+            "name": p.get("name"),
+            "dps": _num(dps.get("mean")),
+            "dps_error": 2 * mean_std if mean_std is not None else None,
+            "iterations": (sim.get("statistics") or {}).get("total_iterations") or dps.get("count"),
+        },
+        "metric": ps.get("metric"),
+        "profilesets": cols,
+    }
+
+
+def view(summary: Dict, sort: str = "mean", order: str = "desc", offset: int = 0,
+         limit: Optional[int] = None, top: Optional[int] = None, delta: str = "baseline") -> Dict:
+    """
+    Rows of a summary, sorted server-side. `top` keeps the best K rows by mean
+    before paging; `delta` is "baseline" or "top" (the best row).
+    """
+    cols = summary.get("profilesets") or {}
+    names = cols.get("name") or []
+    rows = [{c: (cols.get(c) or [None] * len(names))[i] for c in COLUMNS} for i in range(len(names))]
+    rows = [r for r in rows if r["mean"] is not None]
+    rows.sort(key=lambda r: r["mean"], reverse=True)
+    for rank, r in enumerate(rows, 1):
+        r["rank"] = rank
+    if top:
+        rows = rows[:top]
+
+    base = (summary.get("baseline") or {}).get("dps")
+    ref = rows[0]["mean"] if delta == "top" and rows else base
+    for r in rows:
+        r["delta"] = r["mean"] - ref if ref else None
+        r["delta_pct"] = (r["mean"] / ref - 1) * 100 if ref else None
+
+    if sort not in SORT_KEYS:
+        sort = "mean"
+    key = "mean" if sort == "delta" else sort
+    if not (key == "mean" and order == "desc"):
+        present = sorted((r for r in rows if r[key] is not None), key=lambda r: r[key], reverse=(order == "desc"))
+        rows = present + [r for r in rows if r[key] is None]
+    total = len(rows)
+    page = rows[offset:offset + limit] if limit else rows[offset:]
+    return {
+        "baseline": summary.get("baseline"),
+        "metric": summary.get("metric"),
+        "reference": ref,
+        "total": total,
+        "offset": offset,
+        "rows": page,
+    }
@@ -0,0 +1,450 @@
+# backend/scheduling.py
+from __future__ import annotations
+
+import json
+import os
+import re
+import statistics
+from typing import Callable, Dict, List, Optional, Tuple
+
+from . import cpu_budget
+from .queue_utils import get_redis
+from .simc_export import CLASSES
+
+# Jobs go to one of three RQ queues by estimated cost (actors x iterations,
+# scaled by fight length). Workers listen to them in priority order and the
+# quick queue also has a worker of its own, so a 1,770-pair run never sits in
+# front of a quick sim. Within a queue, users take turns: a submission is
+# placed after every queued job of its user's turn (how many submissions the
+# user already has outstanding) and earlier, so one person's backlog doesn't
+# starve everyone else and users at the same turn are served in order.
+QUICK_QUEUE, DEFAULT_QUEUE, BULK_QUEUE = "simc_quick", "simc", "simc_bulk"
+QUEUES = (QUICK_QUEUE, DEFAULT_QUEUE, BULK_QUEUE)  # priority order
+
+QUICK_MAX_COST = float(os.environ.get("SIMC_QUICK_MAX_COST", "50000"))
+BULK_MIN_COST = float(os.environ.get("SIMC_BULK_MIN_COST", "2000000"))
+# Seconds per cost unit for timeouts; deliberately generous (a slow box at 1 thread)
+SECONDS_PER_COST = float(os.environ.get("SIMC_SECONDS_PER_COST", "0.005"))
+MIN_TIMEOUT = int(os.environ.get("SIMC_MIN_TIMEOUT", "300"))
+MAX_TIMEOUT = int(os.environ.get("SIMC_MAX_TIMEOUT", str(6 * 60 * 60)))
+FINALIZE_TIMEOUT = 600  # merging shard results
+MAX_USER_JOBS = int(os.environ.get("SIMC_MAX_USER_JOBS", "0"))  # outstanding submissions per user, 0 = no limit
+
+# Runtime estimates: core-seconds per cost unit, calibrated from the simc runs
+# that finished last (this value until there are enough of them)
+CORE_SECONDS_PER_COST = float(os.environ.get("SIMC_CORE_SECONDS_PER_COST", "0.002"))
+CALIBRATION_SAMPLES = int(os.environ.get("SIMC_CALIBRATION_SAMPLES", "200"))
+# Budgets (0 = none). Precision over the caps is lowered to them; a submission
+# estimated above MAX_CORE_SECONDS runs with fewer iterations, or is rejected
+# if that would take it below BUDGET_MIN_ITERATIONS. A user's outstanding
+# work may take at most USER_MAX_SECONDS of the whole farm's time.
+MAX_ITERATIONS = int(os.environ.get("SIMC_MAX_ITERATIONS", "0"))
+MIN_TARGET_ERROR = float(os.environ.get("SIMC_MIN_TARGET_ERROR", "0"))
+MAX_CORE_SECONDS = float(os.environ.get("SIMC_MAX_CORE_SECONDS", "0"))
+BUDGET_MIN_ITERATIONS = int(os.environ.get("SIMC_BUDGET_MIN_ITERATIONS", "1000"))
+USER_MAX_SECONDS = float(os.environ.get("SIMC_USER_MAX_SECONDS", "0"))
+
+DEFAULT_ITERATIONS = 10000   # roughly what SimC's default target_error ends up running
+DEFAULT_MAX_TIME = 300
+USER_HEADER = "x-raidlocal-user"
+
+_WORK = "raidlocal:sched:work"   # hash: job id -> estimate of every tracked submission
+_TURN = "raidlocal:sched:turn:"  # hash per queue: queued job id -> its user's turn
+_RATE = "raidlocal:sched:rate:"  # list per precision mode: core-seconds per cost unit, newest first
+_MIN_SAMPLES = 5
+_OPTION = re.compile(r"^\s*(iterations|target_error|max_time)\s*=\s*([\d.]+)\s*$")
+_PROFILESET = re.compile(r'^\s*profileset\."([^"]+)"\+?=')
+_ACTOR = re.compile(r"^\s*(%s)\s*=" % "|".join(CLASSES))
+_OUTSTANDING = (b"queued", b"started", b"deferred", b"scheduled")
+
+
+class UserLimitError(Exception):
+    ...
+
+
+class BudgetError(Exception):
+    ...
+
+
+# ---- Cost ----
+def _options(simc_text: str, extra_args: Optional[List[str]]) -> Dict[str, float]:
+    """Last iterations/target_error/max_time from the input, then extra_args (which win)."""
+    opts: Dict[str, float] = {}
+    for line in (simc_text or "").splitlines() + list(extra_args or []):
+        m = _OPTION.match(line)
+        if m:
+            try:
+                opts[m.group(1)] = float(m.group(2))
+            except ValueError:
+                pass
+    return opts
+
+
+def _iterations(opts: Dict[str, float]) -> Tuple[float, str]:
+    """(iterations, precision mode); target_error runs are taken as ~400/target_error^2 iterations."""
+    if "iterations" in opts:
+        return max(opts["iterations"], 1), "iterations"
+    if opts.get("target_error"):
+        return max(400 / opts["target_error"] ** 2, 1), "target_error"
+    return DEFAULT_ITERATIONS, "default"
+
+
+def _cost_parts(simc_text: str, extra_args: Optional[List[str]],
+                profilesets: Optional[int]) -> Tuple[float, float, str, int]:
+    """(cost per iteration, iterations, precision mode, profilesets) of one input."""
+    names, actors = set(), 0
+    for line in (simc_text or "").splitlines():
+        m = _PROFILESET.match(line)
+        if m:
+            names.add(m.group(1))
+        elif _ACTOR.match(line):
+            actors += 1
+    if profilesets is None:
+        profilesets = len(names)
+    opts = _options(simc_text, extra_args)
+    iterations, mode = _iterations(opts)
+    length = opts.get("max_time") or DEFAULT_MAX_TIME
+    return max(actors, 1) * (1 + profilesets) * length / DEFAULT_MAX_TIME, iterations, mode, profilesets
+
+
+def estimate_cost(simc_text: str, extra_args: Optional[List[str]] = None, profilesets: Optional[int] = None) -> float:
+    """
+    Rough work estimate: actors x (baseline + profilesets) x iterations x
+    fight length / 300s. target_error runs are taken as ~400/target_error^2
+    iterations.
+    """
+    per_iteration, iterations, _, _ = _cost_parts(simc_text, extra_args, profilesets)
+    return per_iteration * iterations
+
+
+def queue_for(cost: float) -> str:
+    if cost <= QUICK_MAX_COST:
+        return QUICK_QUEUE
+    return BULK_QUEUE if cost >= BULK_MIN_COST else DEFAULT_QUEUE
+
+
+def timeout_for(cost: float) -> int:
+    return int(min(MAX_TIMEOUT, max(MIN_TIMEOUT, 120 + cost * SECONDS_PER_COST)))
+
+
+# ---- Calibration (best-effort; never raise) ----
+def calibrate(simc_text: str, extra_args: Optional[List[str]], profilesets: Optional[int],
+              seconds: float, threads: int) -> None:
+    """Record what a finished simc run took: core-seconds per cost unit, per precision mode."""
+    per_iteration, iterations, mode, _ = _cost_parts(simc_text, extra_args, profilesets)
+    cost = per_iteration * iterations
+    if cost <= 0 or seconds <= 0:
+        return
+    try:
+        with get_redis().pipeline() as p:
+            p.lpush(_RATE + mode, seconds * max(threads, 1) / cost)
+            p.ltrim(_RATE + mode, 0, CALIBRATION_SAMPLES - 1)
+            p.execute()
+    except Exception:
+        pass
+
+
+def core_seconds_per_cost(mode: str = "iterations") -> float:
+    """Median of the recent samples of a precision mode (SIMC_CORE_SECONDS_PER_COST until there are a few)."""
+    try:
+        samples = [float(v) for v in get_redis().lrange(_RATE + mode, 0, -1)]
+    except Exception:
+        samples = []
+    return statistics.median(samples) if len(samples) >= _MIN_SAMPLES else CORE_SECONDS_PER_COST
+
+
+# ---- Budgets ----
+def _budget_steps(below: float) -> List[int]:
+    """
+    Iteration counts a submission over budget may be lowered to, highest
+    first: 1-2-5 steps from BUDGET_MIN_ITERATIONS up to `below`. Fixed steps
+    keep repeat submissions on the same settings, so their rows stay cached.
+    """
+    steps, scale = {BUDGET_MIN_ITERATIONS} if BUDGET_MIN_ITERATIONS < below else set(), 1
+    while scale < below:
+        steps |= {m * scale for m in (1, 2, 5) if BUDGET_MIN_ITERATIONS <= m * scale < below}
+        scale *= 10
+    return sorted(steps, reverse=True)
+
+
+def _core_seconds(simc_text: str, args: List[str], profilesets: Optional[int]) -> float:
+    per_iteration, iterations, mode, _ = _cost_parts(simc_text, args, profilesets)
+    return per_iteration * iterations * core_seconds_per_cost(mode)
+
+
+def admit(simc_text: str, extra_args: Optional[List[str]], profilesets: Optional[int] = None,
+          remaining: Optional[Callable[[List[str]], int]] = None) -> Tuple[List[str], Optional[str]]:
+    """
+    Apply the precision caps and the per-submission budget to a whole
+    request. Returns the extra_args to run with (lowered precision is
+    appended, so it wins) and a note on what was lowered, or raises
+    BudgetError when even BUDGET_MIN_ITERATIONS would be over budget.
+
+    remaining(args): profilesets still to sim under those args (the rest
+    are memoized); only that many count against the budget. Without it,
+    all `profilesets` do.
+    """
+    args = list(extra_args or [])
+    notes: List[str] = []
+    opts = _options(simc_text, args)
+    if MAX_ITERATIONS and opts.get("iterations", 0) > MAX_ITERATIONS:
+        args.append(f"iterations={MAX_ITERATIONS}")
+        notes.append(f"iterations capped at {MAX_ITERATIONS}")
+    elif MIN_TARGET_ERROR and "iterations" not in opts and 0 < opts.get("target_error", 1e9) < MIN_TARGET_ERROR:
+        args.append(f"target_error={MIN_TARGET_ERROR:g}")
+        notes.append(f"target_error raised to {MIN_TARGET_ERROR:g}")
+    if MAX_CORE_SECONDS:
+        remaining = remaining or (lambda _: profilesets)
+        core = _core_seconds(simc_text, args, remaining(args))
+        if core > MAX_CORE_SECONDS:
+            _, iterations, _, _ = _cost_parts(simc_text, args, profilesets)
+            for step in _budget_steps(iterations):
+                lowered = args + ["target_error=0", f"iterations={step}"]
+                # the baseline alone must fit before the memo is worth asking
+                if _core_seconds(simc_text, lowered, 0) <= MAX_CORE_SECONDS \
+                        and _core_seconds(simc_text, lowered, remaining(lowered)) <= MAX_CORE_SECONDS:
+                    notes.append(f"iterations lowered to {step} to fit the {MAX_CORE_SECONDS:,.0f} core-second budget")
+                    return lowered, "; ".join(notes)
+            raise BudgetError(f"Estimated {core:,.0f} core-seconds, over the limit of {MAX_CORE_SECONDS:,.0f} "
+                              f"even at {BUDGET_MIN_ITERATIONS} iterations. Sim fewer profilesets or a shorter fight.")
+    return args, "; ".join(notes) or None
+
+
+# ---- Outstanding work and ETA ----
+def _work(conn) -> List[Dict]:
+    """
+    Tracked submissions still queued or running, each with the core-seconds
+    it has left (running ones by elapsed share of their estimate). Ended or
+    expired ones are dropped.
+    """
+    from rq.utils import utcnow, utcparse
+
+    raw = conn.hgetall(_WORK)
+    if not raw:
+        return []
+    ids = [k.decode() for k in raw]
+    pipe = conn.pipeline()
+    for i in ids:
+        pipe.hmget(f"rq:job:{i}", "status", "started_at")
+    now = utcnow()
+    out, done = [], []
+    for i, (status, started) in zip(ids, pipe.execute()):
+        if status not in _OUTSTANDING:
+            done.append(i)
+            continue
+        w = json.loads(raw[i.encode()])
+        left = w["core_seconds"]
+        if status == b"started" and started and w.get("seconds"):
+            ran = (now - utcparse(started.decode())).total_seconds()
+            left *= max(0.0, 1 - ran / w["seconds"])
+        out.append({**w, "id": i, "status": status.decode(), "left": left})
+    if done:
+        conn.hdel(_WORK, *done)
+    return out
+
+
+def capacities() -> Dict[str, int]:
+    """
+    simc threads of the live sim nodes serving each queue (this host's cores
+    if none are registered). Nodes on one core budget are counted once.
+    """
+    from . import nodes
+
+    try:
+        live = nodes.summary()
+    except Exception:
+        live = []
+    out = {}
+    for q in QUEUES:
+        hosts = {n["host"]: n["cores"] for n in live if q in n["queues"]}
+        out[q] = sum(hosts.values()) or cpu_budget.CORES
+    return out
+
+
+def queue_eta(work: List[Dict], queue: str, threads: Dict[str, int], turn: Optional[int] = None) -> float:
+    """
+    Seconds until a job submitted to `queue` now would start: the work left
+    in higher-priority queues and ahead of it in its own (running, or queued
+    at `turn` or earlier; everything if no turn is given), over the threads
+    serving the queue.
+    """
+    ahead = QUEUES[:QUEUES.index(queue)]
+    left = sum(w["left"] for w in work if w["queue"] in ahead
+               or (w["queue"] == queue and (turn is None or w["status"] == "started" or w.get("turn", 0) <= turn)))
+    return left / threads[queue]
+
+
+def _farm_seconds(work: List[Dict], threads: Dict[str, int]) -> float:
+    return sum(w["left"] / threads.get(w["queue"], cpu_budget.CORES) for w in work)
+
+
+def queue_state(user: Optional[str] = None) -> Dict:
+    """
+    {"queues": {queue: outstanding submissions, core-seconds left, threads
+    serving it, ETA of a new job}} plus, for `user`, their outstanding
+    submissions and share of the farm in seconds.
+    """
+    work, threads = _work(get_redis()), capacities()
+    out: Dict = {"queues": {}}
+    for q in QUEUES:
+        jobs = [w for w in work if w["queue"] == q]
+        out["queues"][q] = {"jobs": len(jobs), "core_seconds": round(sum(w["left"] for w in jobs), 1),
+                            "threads": threads[q], "eta_seconds": round(queue_eta(work, q, threads), 1)}
+    if user:
+        mine = [w for w in work if w["user"] == user]
+        out["user"] = {"id": user, "jobs": len(mine), "seconds": round(_farm_seconds(mine, threads), 1),
+                       "max_seconds": USER_MAX_SECONDS or None, "max_jobs": MAX_USER_JOBS or None}
+    return out
+
+
+# ---- Fairness ----
+def user_id(request) -> str:
+    """Who submitted: the X-RaidLocal-User header, else the client address."""
+    uid = (request.headers.get(USER_HEADER) or "").strip()[:64] if request is not None else ""
+    if not uid and request is not None and request.client:
+        uid = request.client.host
+    return uid or "anonymous"
+
+
+def outstanding(user: str) -> List[str]:
+    """The user's submissions still queued or running (finished ones are dropped)."""
+    return [w["id"] for w in _work(get_redis()) if w["user"] == user]
+
+
+def plan(simc_text: str, extra_args: Optional[List[str]], user: Optional[str], profilesets: Optional[int] = None) -> Dict:
+    """
+    Where and how to enqueue one submission, and what it will take:
+    {"queue", "cost", "timeout", "turn", "threads", "core_seconds",
+    "base_core_seconds", "eta"}. Raises UserLimitError when the user already
+    has SIMC_MAX_USER_JOBS submissions, or more than SIMC_USER_MAX_SECONDS of
+    farm time, outstanding.
+    """
+    per_iteration, iterations, mode, profilesets = _cost_parts(simc_text, extra_args, profilesets)
+    cost = per_iteration * iterations
+    rate = core_seconds_per_cost(mode)
+    queue = queue_for(cost)
+    try:
+        work = _work(get_redis())
+    except Exception:
+        work = []
+    threads = capacities()
+    mine = [w for w in work if user and w["user"] == user]
+    if MAX_USER_JOBS and len(mine) >= MAX_USER_JOBS:
+        raise UserLimitError(f"You already have {len(mine)} sims queued or running (max {MAX_USER_JOBS}).")
+    if USER_MAX_SECONDS and mine:
+        share = _farm_seconds(mine, threads) + cost * rate / threads[queue]
+        if share > USER_MAX_SECONDS:
+            raise UserLimitError(f"Your queued sims would take about {share:,.0f}s of the farm "
+                                 f"(max {USER_MAX_SECONDS:,.0f}s). Wait for some of them to finish.")
+    turn = len(mine)
+    return {"queue": queue, "cost": cost, "timeout": timeout_for(cost), "turn": turn,
+            "threads": cpu_budget.wanted_threads(extra_args, profilesets), "core_seconds": cost * rate,
+            "base_core_seconds": cost / (1 + profilesets) * rate, "eta": queue_eta(work, queue, threads, turn)}
+
+
+def estimate(plan: Dict, shards: int = 1) -> Dict:
+    """
+    Runtime estimate of a planned run split into `shards` parallel jobs
+    (each of which also sims the baseline): core-seconds, wall seconds once
+    started, and the queue wait before it starts.
+    """
+    shards = max(1, shards)
+    core = plan["core_seconds"] + (shards - 1) * plan["base_core_seconds"]
+    return {"queue": plan["queue"], "cost": round(plan["cost"]), "core_seconds": round(core, 1),
+            "seconds": round(core / (plan["threads"] * shards), 1), "queue_eta_seconds": round(plan["eta"], 1)}
+
+
+def place(queue, job_ids: List[str], turn: int) -> None:
+    """
+    Move jobs just enqueued at the tail of `queue` (an RQ Queue) to their
+    user's turn: ahead of the first queued job of a later turn. Jobs
+    without a turn (requeued, promoted dependents) count as turn 0.
+    Best-effort; a job a worker already took is left alone.
+    """
+    from redis.exceptions import WatchError
+
+    turns_key = _TURN + queue.name
+    try:
+        with queue.connection.pipeline() as p:
+            for _ in range(5):
+                try:
+                    p.watch(queue.key)
+                    queued = [i.decode() for i in p.lrange(queue.key, 0, -1)]
+                    present = set(queued)
+                    mine = [j for j in job_ids if j in present]
+                    others = [i for i in queued if i not in job_ids]
+                    turns = dict(zip(others, p.hmget(turns_key, others))) if others else {}
+                    pivot = next((i for i in others if int(turns[i] or 0) > turn), None)
+                    stale = [k for k in (k.decode() for k in p.hkeys(turns_key)) if k not in present]
+                    p.multi()
+                    if pivot is not None:
+                        for j in mine:
+                            p.lrem(queue.key, 0, j)
+                            p.linsert(queue.key, "BEFORE", pivot, j)
+                    if mine:
+                        p.hset(turns_key, mapping={j: turn for j in mine})
+                    if stale:
+                        p.hdel(turns_key, *stale)
+                    p.execute()
+                    return
+                except WatchError:
+                    continue
+    except Exception:
+        pass
+
+
+def track(user: Optional[str], job_id: str, est: Optional[Dict] = None, turn: int = 0) -> None:
+    """Remember a submission (its estimate and turn) for fairness, budgets and queue ETAs."""
+    est = est or {}
+    try:
+        get_redis().hset(_WORK, job_id, json.dumps({
+            "user": user or "anonymous", "queue": est.get("queue", DEFAULT_QUEUE),
+            "core_seconds": est.get("core_seconds", 0.0), "seconds": est.get("seconds", 0.0), "turn": turn,
+        }))
+    except Exception:
+        pass
+
+
+# ---- Cancellation ----
+def dependency_ids(job) -> List[str]:
+    """Ids of the jobs `job` waits on (RQ's dependency_ids are full `rq:job:` keys, as bytes)."""
+    prefix = job.redis_job_namespace_prefix
+    return [k.decode()[len(prefix):] for k in job.dependency_ids]
+
+
+def cancel(job_id: str, connection=None) -> List[str]:
+    """
+    Cancel a job and everything it depends on (shards, stage one). Queued
+    jobs are dropped; running ones get RQ's stop command, which kills the
+    work horse's process group and with it the simc subprocess.
+    Returns the ids that were canceled or stopped.
+    """
+    from rq.command import send_stop_job_command
+    from rq.job import Job, JobStatus
+
+    connection = connection or get_redis()
+    done: List[str] = []
+    todo, seen = [job_id], set()
+    while todo:
+        jid = todo.pop()
+        if jid in seen:
+            continue
+        seen.add(jid)
+        try:
+            job = Job.fetch(jid, connection=connection)
+        except Exception:
+            continue
+        todo.extend(dependency_ids(job))
+        status = job.get_status()
+        try:
+            if status == JobStatus.STARTED:
+                send_stop_job_command(connection, jid)
+            elif status in (JobStatus.QUEUED, JobStatus.DEFERRED, JobStatus.SCHEDULED):
+                job.cancel()
+            else:
+                continue
+            done.append(jid)
+        except Exception:
+            pass
+    return done
+
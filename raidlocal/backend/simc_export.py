@@ -0,0 +1,157 @@
+# backend/simc_export.py
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# One pass over a /simc addon export builds an indexed model (actor header,
+# equipped gear by slot, bag items with their labels); the extract_* helpers
+# in simc_runner and the parse endpoints all read from it. Models are cached
+# per export text, so repeated lookups on one paste cost a dict hit.
+SLOTS = ("head", "neck", "shoulder", "back", "chest", "shirt", "tabard", "wrist", "hands", "waist",
+         "legs", "feet", "finger1", "finger2", "trinket1", "trinket2", "main_hand", "off_hand")
+CLASSES = ("warrior", "paladin", "hunter", "rogue", "priest", "deathknight", "shaman", "mage",
+           "warlock", "monk", "druid", "demonhunter", "evoker")
+
+_ASSIGN = re.compile(r"^\s*(?P<key>[A-Za-z_][\w.]*)\s*=\s*(?P<rhs>.*?)\s*$")
+_ITEM_LABEL = re.compile(r"^#\s*(?P<label>.+?)\s*\((?P<ilvl>\d+)\)\s*$")  # "# Void-Touched Fragment (681)"
+_SECTION = re.compile(r"^###\s*(?P<title>.*?)\s*$")
+_BAGS_SECTION = "gear from bags"
+
+
+@dataclass(frozen=True)
+class Item:
+    slot: str                # "trinket1", "finger2", ...
+    tail: str                # ",id=...,bonus_id=..." exactly as exported
+    source: str              # "equipped" or "bags"
+    label: Optional[str] = None
+    item_id: Optional[int] = None
+    bonus_ids: Tuple[int, ...] = ()
+    ilevel: Optional[int] = None
+    fields: Tuple[Tuple[str, str], ...] = ()  # every key=value of the tail, in order
+
+    @property
+    def override(self) -> str:
+        return f"{self.slot}={self.tail}"
+
+    @property
+    def key(self) -> str:
+        """The tail without surrounding whitespace: what tells items apart."""
+        return self.tail.strip()
+
+    @property
+    def group(self) -> str:
+        return slot_group(self.slot)
+
+    def get(self, key: str) -> Optional[str]:
+        for k, v in self.fields:
+            if k == key:
+                return v
+        return None
+
+
+@dataclass
+class Profile:
+    actor_class: Optional[str] = None
+    actor_name: Optional[str] = None
+    header: Dict[str, str] = field(default_factory=dict)  # level, race, spec, talents, ...
+    equipped: Dict[str, Item] = field(default_factory=dict)
+    bags: Tuple[Item, ...] = ()
+    _by_group: Dict[str, Tuple[Item, ...]] = field(default_factory=dict, repr=False)
+
+    def bag_items(self, slots: Iterable[str] = SLOTS) -> List[Item]:
+        wanted = set(slots)
+        return [it for it in self.bags if it.slot in wanted]
+
+    def equipped_items(self, slots: Iterable[str] = SLOTS) -> List[Item]:
+        return [self.equipped[s] for s in slots if s in self.equipped]
+
+    def candidates(self, group: str) -> Tuple[Item, ...]:
+        """Equipped + bag items that fit a slot group ("trinket", "finger", "head", ...), deduped by key."""
+        return self._by_group.get(group, ())
+
+
+def slot_group(slot: str) -> str:
+    """"trinket1"/"trinket2" -> "trinket", "finger1"/"finger2" -> "finger"; other slots map to themselves."""
+    return slot[:-1] if slot[-1:] in ("1", "2") and slot[:-1] in ("trinket", "finger") else slot
+
+
+def _ints(v: Optional[str]) -> Tuple[int, ...]:
+    return tuple(int(x) for x in (v or "").split("/") if x.isdigit())
+
+
+def _raw_rhs(line: str) -> str:
+    # what follows "slot=", trailing whitespace included, as the override is kept verbatim
+    return line.split("=", 1)[1].lstrip()
+
+
+def _item(slot: str, rhs: str, source: str, label: Optional[str], label_ilvl: Optional[str]) -> Item:
+    tail = rhs if rhs.startswith(",") else "," + rhs
+    fields = tuple((k.strip(), v.strip()) for k, _, v in (p.partition("=") for p in tail.split(",") if p))
+    f = dict(fields)
+    item_id, ilevel = _ints(f.get("id")), _ints(f.get("ilevel"))
+    return Item(
+        slot=slot, tail=tail, source=source, label=label,
+        item_id=item_id[0] if item_id else None,
+        bonus_ids=_ints(f.get("bonus_id")),
+        ilevel=ilevel[0] if ilevel else (int(label_ilvl) if label_ilvl else None),
+        fields=fields,
+    )
+
+
+@lru_cache(maxsize=64)
+def parse(simc_text: str) -> Profile:
+    """Model of one export. Cached and shared: treat the result as read-only."""
+    prof = Profile()
+    bags: List[Item] = []
+    section = ""
+    label = label_ilvl = None
+    slots = set(SLOTS)
+
+    for line in (simc_text or "").splitlines():
+        s = line.strip()
+        if not s:
+            continue
+        if s.startswith("#"):
+            sec = _SECTION.match(s)
+            if sec:
+                section, label = sec.group("title").lower(), None
+                continue
+            lbl = _ITEM_LABEL.match(s)
+            if lbl:
+                label, label_ilvl = lbl.group("label"), lbl.group("ilvl")
+                continue
+            if section == _BAGS_SECTION:
+                m = _ASSIGN.match(s[1:])
+                if m and m.group("key") in slots and m.group("rhs").startswith(","):
+                    # a label names every bag item after it, up to the next label
+                    bags.append(_item(m.group("key"), _raw_rhs(line), "bags", label, label_ilvl))
+            continue
+
+        m = _ASSIGN.match(s)
+        if not m:
+            continue
+        key, rhs = m.group("key"), m.group("rhs")
+        if key in slots:
+            if rhs.startswith(","):
+                prof.equipped[key] = _item(key, _raw_rhs(line), "equipped", label, label_ilvl)
+            label = None
+        elif key.startswith("profileset.") or key.startswith("copy"):
+            continue
+        elif key in CLASSES and prof.actor_class is None:
+            prof.actor_class, prof.actor_name = key, rhs.strip('"')
+        elif prof.actor_class is not None and key not in CLASSES:
+            prof.header[key] = rhs  # SimC: last assignment wins
+
+    prof.bags = tuple(bags)
+    groups: Dict[str, List[Item]] = {}
+    seen = set()
+    for it in list(prof.equipped.values()) + bags:
+        if (it.group, it.key) in seen:
+            continue
+        seen.add((it.group, it.key))
+        groups.setdefault(it.group, []).append(it)
+    prof._by_group = {g: tuple(v) for g, v in groups.items()}
+    return prof
@@ -1,9 +1,19 @@
 # backend/simc_runner.py
 from __future__ import annotations
-import json, os, subprocess, tempfile, re
+import os, shutil, subprocess, tempfile, time, re
+from collections import deque
+from functools import lru_cache
 from typing import Dict, List, Optional
 
+from . import artifacts, cpu_budget, metrics, progress, report_reader, result_cache, result_view, scheduling, simc_export
+
 SIMC_BIN = os.environ.get("SIMC_BIN", "/usr/local/bin/simc")
+STDOUT_TAIL = 8192  # chars of simc output kept in job results (full log is an artifact)
+# Per-job scratch directory for the input, reports and log. Point it at a
+# tmpfs to keep simc's report writes in RAM; the system temp dir is used when
+# it is unset, missing or has less than SIMC_WORKDIR_MIN_FREE_MB free.
+WORKDIR = os.environ.get("SIMC_WORKDIR") or None
+WORKDIR_MIN_FREE = int(os.environ.get("SIMC_WORKDIR_MIN_FREE_MB", "256")) * 1024 * 1024
 
 # Optional: batch metadata fetch (if implemented in item_parser)
 try:
@@ -31,136 +41,360 @@ def trinket_tail_from_override(override: str) -> str:
 
 def _equipped_trinket_tails(base_profile: str):
     """Return (t1_tail, t2_tail) from the base actor or (None, None) if missing."""
-    t1 = t2 = None
-    pat = re.compile(r'^\s*(trinket[12])\s*=\s*(,.*)$')
-    for line in base_profile.splitlines():
-        if line.lstrip().startswith("#"):
-            continue
-        m = pat.match(line)
-        if not m:
-            continue
-        slot, rhs = m.group(1), m.group(2).strip()
-        rhs = rhs if rhs.startswith(",") else ("," + rhs)
-        if slot == "trinket1":
-            t1 = rhs
-        else:
-            t2 = rhs
-    return t1, t2
+    eq = simc_export.parse(base_profile).equipped
+    return tuple(eq[s].key if s in eq else None for s in ("trinket1", "trinket2"))
 
 
-def _build_cmd(simc_file: str, html_path: str, json_path: str, extra: Optional[List[str]]) -> List[str]:
-    cmd = [SIMC_BIN, simc_file, f"json2={json_path}", f"html={html_path}"]
+def _build_cmd(simc_file: str, html_path: Optional[str], json_path: str, extra: Optional[List[str]]) -> List[str]:
+    cmd = [SIMC_BIN, simc_file, f"json2={json_path}"] + ([f"html={html_path}"] if html_path else [])
     if extra:
         cmd.extend(extra)
     return cmd
 
 
-def run_simc_from_text(simc_text: str, extra_args: Optional[List[str]] = None) -> Dict:
-    with tempfile.TemporaryDirectory(prefix="simcjob_") as d:
+@lru_cache(maxsize=1)
+def simc_version() -> str:
+    """First banner line of the simc binary (version + git build), used in cache keys."""
+    try:
+        proc = subprocess.run([SIMC_BIN], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, timeout=30)
+        for line in proc.stdout.splitlines():
+            if line.strip():
+                return line.strip()
+    except Exception:
+        pass
+    try:
+        st = os.stat(SIMC_BIN)
+        return f"{SIMC_BIN}:{st.st_size}:{int(st.st_mtime)}"
+    except OSError:
+        return "unknown"
+
+
+def verify_simc() -> str:
+    """
+    The simc banner, after checking the binary runs and is SimulationCraft
+    (warm workers refuse to start otherwise). Also primes simc_version().
+    """
+    banner = simc_version()
+    if not banner.startswith("SimulationCraft"):
+        raise SimcRunError(f"{SIMC_BIN} is not a working simc binary (banner: {banner!r})")
+    return banner
+
+
+def _workdir() -> Optional[str]:
+    if not WORKDIR:
+        return None
+    try:
+        if os.access(WORKDIR, os.W_OK) and shutil.disk_usage(WORKDIR).free >= WORKDIR_MIN_FREE:
+            return WORKDIR
+    except OSError:
+        pass
+    return None
+
+
+def result_cache_key(simc_text: str, extra_args: Optional[List[str]] = None) -> str:
+    return result_cache.cache_key(simc_text, extra_args, simc_version())
+
+
+@metrics.timed_job
+def run_simc_from_text(simc_text: str, extra_args: Optional[List[str]] = None, cache_key: Optional[str] = None) -> Dict:
+    """
+    Run simc on one input. The result is cached under `cache_key` (a whole
+    submission's key) if given; shard and stage-one runs pass none, since
+    only their finalizer's merged result is ever looked up.
+    """
+    with tempfile.TemporaryDirectory(prefix="simcjob_", dir=_workdir()) as d:
         simc_file = os.path.join(d, "input.simc")
         json_path = os.path.join(d, "report.json")
         html_path = os.path.join(d, "report.html")
+        log_path = os.path.join(d, "simc.log")
         with open(simc_file, "w", encoding="utf-8") as f:
             f.write(simc_text)
-        proc = subprocess.run(
-            _build_cmd(simc_file, html_path, json_path, extra_args or []),
-            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
-        )
+        reporter = progress.JobReporter()
+        # merged shard runs only link the first shard's HTML report
+        if reporter.job is not None and reporter.job.meta.get("shard", 0) > 0:
+            html_path = None
+        profilesets = count_profilesets(simc_text)
+        want = cpu_budget.wanted_threads(extra_args, profilesets)
+        on_wait = lambda: reporter.publish({"type": "status", "status": "waiting for cores"})
+        quick = getattr(reporter.job, "origin", None) == scheduling.QUICK_QUEUE
+        reserve = 0 if quick else cpu_budget.QUICK_RESERVE
+        with metrics.stage("simc"), cpu_budget.lease(want, on_wait, reserve=reserve) as threads:
+            reporter.publish({"type": "status", "status": "simulating", "threads": threads})
+            started = time.perf_counter()
+            proc = subprocess.Popen(
+                _build_cmd(simc_file, html_path, json_path, cpu_budget.with_threads(extra_args, threads)),
+                stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
+            )
+            # Read output as it comes (text mode splits SimC's "\r" progress
+            # updates into lines); it goes to the log file, only the tail is kept
+            tail: deque = deque(maxlen=512)
+            try:
+                with open(log_path, "w", encoding="utf-8") as log:
+                    for line in proc.stdout:
+                        log.write(line)
+                        tail.append(line)
+                        info = progress.parse_progress(line)
+                        if info:
+                            reporter.progress(info)
+                proc.wait()
+                ran = time.perf_counter() - started
+            finally:
+                # job timeout or stop: don't leave simc running without us
+                if proc.poll() is None:
+                    proc.kill()
+                    proc.wait()
+        stdout = "".join(tail)[-STDOUT_TAIL:]
         if proc.returncode != 0:
-            raise SimcRunError(f"simc rc={proc.returncode}\n{proc.stdout}")
-        data: Dict = {}
-        if os.path.exists(json_path):
-            with open(json_path, "r", encoding="utf-8") as jf:
-                data = json.load(jf)
-        html = ""
-        if os.path.exists(html_path):
-            with open(html_path, "r", encoding="utf-8") as hf:
-                html = hf.read()
-        return {"json": data, "html": html, "stdout": proc.stdout}
+            raise SimcRunError(f"simc rc={proc.returncode}\n{stdout}")
+        with metrics.stage("read_back"):
+            # Only the baseline and profileset parts of the json2 report are
+            # read; the files themselves are streamed (hashed, gzipped) into
+            # the artifact store and the job result only keeps their ids.
+            data = report_reader.read_report(json_path) if os.path.exists(json_path) else {}
+            result = {
+                "json": data,
+                "summary": result_view.summarize(data),
+                "html_id": artifacts.save_file(html_path, "html") if html_path else None,
+                "json_id": artifacts.save_file(json_path, "json"),
+                "log_id": artifacts.save_file(log_path, "txt") if os.path.getsize(log_path) else None,
+                "stdout": stdout,
+            }
+        elapsed = metrics.simc_elapsed(data)
+        if elapsed is not None:
+            metrics.record("simc_reported", elapsed)
+        scheduling.calibrate(simc_text, extra_args, profilesets, elapsed or ran, threads)
+        reporter.rows(profileset_rows(data))
+        if cache_key:
+            with metrics.stage("serialize"):
+                result_cache.put(cache_key, result)
+        return result
+
+
+# --- sharded profileset runs ---
+_PROFILESET_LINE = re.compile(r'^\s*profileset\."(?P<name>[^"]+)"\+?=')
+
+
+def count_profilesets(simc_text: str) -> int:
+    return len({m.group("name") for m in map(_PROFILESET_LINE.match, simc_text.splitlines()) if m})
+
+
+def split_profilesets(simc_text: str, shards: int) -> List[str]:
+    """
+    Split a profileset input into at most `shards` inputs that share the same
+    base actor/options and each carry a contiguous chunk of the profilesets.
+    All lines of a profileset (`=` and `+=`) stay together.
+    """
+    base: List[str] = []
+    groups: Dict[str, List[str]] = {}
+    for line in simc_text.splitlines():
+        m = _PROFILESET_LINE.match(line)
+        if not m:
+            base.append(line)
+            continue
+        groups.setdefault(m.group("name"), []).append(line.strip())
 
+    names = list(groups)
+    shards = max(1, min(int(shards), len(names)))
+    if shards <= 1:
+        return [simc_text]
 
-def generate_profilesets(base_profile: str, profiles: List[Dict]) -> str:
-    lines = [base_profile.strip(), ""]
-    for p in profiles:
-        name = p.get("name", "noname").replace(".", "_")
-        overrides = p.get("overrides", [])
-        if not overrides:
-            continue
-        lines.append(f'profileset."{name}"={overrides[0]}')
-        for opt in overrides[1:]:
-            lines.append(f'profileset."{name}"+={opt}')
-    return "\n".join(lines) + "\n"
+    head = "\n".join(base).strip()
+    size = -(-len(names) // shards)  # ceil
+    out = []
+    for i in range(0, len(names), size):
+        lines = [head, ""]
+        for name in names[i:i + size]:
+            lines.extend(groups[name])
+        out.append("\n".join(lines) + "\n")
+    return out
 
 
-def extract_bag_overrides(simc_text: str, slots=("trinket1", "trinket2")):
+def profileset_rows(data: Dict) -> List[Dict]:
+    """`sim.profilesets.results` of a SimC json2 report ([] if absent)."""
+    return (((data or {}).get("sim") or {}).get("profilesets") or {}).get("results") or []
+
+
+def with_profileset_rows(data: Dict, rows: List[Dict]) -> Dict:
+    """Copy of a json2 report whose `sim.profilesets.results` is `rows`."""
+    sim = dict((data or {}).get("sim") or {})
+    sim["profilesets"] = {**(sim.get("profilesets") or {}), "results": rows}
+    return {**(data or {}), "sim": sim}
+
+
+def with_baseline(data: Dict, baseline: Dict) -> Dict:
+    """Copy of a json2 report with everything but `sim.profilesets` taken from `baseline`."""
+    sim = {**((baseline or {}).get("sim") or {})}
+    ps = ((data or {}).get("sim") or {}).get("profilesets")
+    if ps is not None:
+        sim["profilesets"] = ps
+    return {**(baseline or {}), "sim": sim}
+
+
+def merge_profileset_results(results: List[Dict]) -> Dict:
     """
-    Parse the '### Gear from Bags' section of a /simc export and return
-    [{"name": str, "overrides": ["<slot>=,id=...,bonus_id=..."]}, ...]
-    Defaults to trinket1/trinket2.
+    Merge shard results ({"json","html_id",...,"stdout"}) into one result with the
+    same shape as a single run: baseline data from the first shard and the
+    concatenated `sim.profilesets.results` of every shard.
     """
-    wanted = set(slots)
-    results = []
-    in_bags = False
-    last_label = None
+    if not results:
+        return {"json": {}, "stdout": ""}
+    rows: List[Dict] = []
+    for r in results:
+        rows.extend(profileset_rows(r.get("json") or {}))
+    merged = with_profileset_rows(results[0].get("json") or {}, rows)
+    stdout = "\n".join(f"--- shard {i + 1}/{len(results)} ---\n{r.get('stdout', '')}" for i, r in enumerate(results))
+    # The per-shard HTML reports only cover their own chunk, so link the first
+    # one (it has the full baseline section) rather than pretending to merge.
+    return {"json": merged, "html_id": results[0].get("html_id"), "stdout": stdout[-STDOUT_TAIL:]}
 
-    pat_bags_hdr = re.compile(r"^###\s*Gear from Bags\s*$")
-    pat_next_hdr = re.compile(r"^###\s+")
-    pat_item_label = re.compile(r"^#\s*(.+?)\s*\(\d+\)\s*$")  # "# Void-Touched Fragment (681)"
-    pat_assign = re.compile(r"^#\s*(\w+)\s*=\s*(,.*)$")       # "# trinket1=,id=238386,bonus_id=..."
 
-    for line in simc_text.splitlines():
-        if pat_bags_hdr.match(line):
-            in_bags = True
-            continue
-        if in_bags and pat_next_hdr.match(line):
-            break  # end of bags section
+@metrics.timed_job
+def finalize_sharded_run(child_ids: List[str], cache_key: Optional[str] = None, memo: Optional[Dict] = None) -> Dict:
+    """RQ job: merge the shard results once every shard job has ended."""
+    from rq import get_current_job
+    from rq.job import Job
 
-        if not in_bags:
-            continue
+    conn = get_current_job().connection
+    children = Job.fetch_many(child_ids, connection=conn)
+    failed = [cid for cid, j in zip(child_ids, children) if j is None or not j.is_finished]
+    if failed:
+        raise SimcRunError(f"{len(failed)} of {len(child_ids)} shard(s) failed: {', '.join(failed)}")
+    return finish_profileset_run(merge_profileset_results([j.result or {} for j in children]), cache_key, memo)
 
-        m_lbl = pat_item_label.match(line)
-        if m_lbl:
-            last_label = m_lbl.group(1)
-            continue
 
-        m_ass = pat_assign.match(line)
-        if not m_ass:
-            continue
+@metrics.timed_job
+def run_profileset_job(simc_text: str, extra_args: Optional[List[str]] = None,
+                       cache_key: Optional[str] = None, memo: Optional[Dict] = None) -> Dict:
+    """RQ job: run_simc_from_text followed by finish_profileset_run."""
+    return finish_profileset_run(run_simc_from_text(simc_text, extra_args), cache_key, memo)
 
-        slot, rhs = m_ass.group(1), m_ass.group(2)
-        if slot not in wanted:
-            continue
 
-        # Keep the string EXACTLY as SimC emits it (leading comma + equals)
-        override = f"{slot}={rhs}"  # e.g. "trinket1=,id=238386,bonus_id=..."
+# --- two-stage (pruned) profileset runs ---
+_PRECISION_ARGS = ("target_error=", "iterations=")
 
-        m_id = re.search(r"id=(\d+)", rhs)
-        item_id = m_id.group(1) if m_id else "item"
-        base_name = last_label or f"{slot}_{item_id}"
-        name = _sanitize_name(f"{slot}_{base_name}_{item_id}")
 
-        results.append({"name": name, "overrides": [override]})
+def stage_one_args(extra_args: Optional[List[str]], target_error: float) -> List[str]:
+    """extra_args with the precision settings replaced by a coarse `target_error`."""
+    args = [a for a in (extra_args or []) if not a.strip().startswith(_PRECISION_ARGS)]
+    return args + [f"target_error={target_error:g}"]
 
-    return results
+
+def stage_two_candidates(rows: List[Dict], margin_pct: float) -> List[str]:
+    """
+    Names of the rows that could be within `margin_pct` % of the leader,
+    giving every row (and the leader) the benefit of its error bar.
+    """
+    scored = [r for r in rows if isinstance(r.get("mean"), (int, float))]
+    if not scored:
+        return []
+    err = lambda r: r.get("mean_error") or 2 * (r.get("mean_stddev") or 0)
+    lead = max(scored, key=lambda r: r["mean"])
+    floor = lead["mean"] * (1 - margin_pct / 100.0) - err(lead)
+    return [r["name"] for r in scored if r["mean"] + err(r) >= floor]
+
+
+@metrics.timed_job
+def run_stage_two(stage_one_id: str, base_profile: str, profiles: List[Dict], extra_args: Optional[List[str]],
+                  margin_pct: float, cache_key: Optional[str] = None, memo: Optional[Dict] = None) -> Dict:
+    """
+    RQ job (runs after the low-precision stage-one job): re-sim the stage-one
+    candidates near the leader at full precision. Every row is tagged with the
+    stage it came from; rows pruned after stage one keep their coarse numbers.
+    """
+    from rq import get_current_job
+    from rq.job import Job
+
+    first = Job.fetch(stage_one_id, connection=get_current_job().connection)
+    if not first.is_finished:
+        raise SimcRunError(f"stage one ({stage_one_id}) did not finish: {first.get_status()}")
+    rows1 = profileset_rows((first.result or {}).get("json") or {})
+    cached = (memo or {}).get("cached") or []
+    keep = set(stage_two_candidates(rows1 + cached, margin_pct))
+
+    todo = [p for p in profiles if profileset_name(p) in keep]
+    # with no row to re-sim, the shared full-precision baseline is all stage two needs
+    baseline = result_cache.shared_baseline(memo["key"]) if memo and not todo and not memo.get("fresh") else None
+    if baseline is not None:
+        result = {"json": baseline, "stdout": ""}
+    else:
+        result = run_simc_from_text(generate_profilesets(base_profile, todo), extra_args)
+    result = finish_profileset_run(result, None, memo)
+    data = result.get("json") or {}
+    rows = [{**r, "stage": 2} for r in profileset_rows(data)]
+    rows += [{**r, "stage": 1} for r in rows1 if r.get("name") not in keep]
+    data = with_profileset_rows(data, rows)
+    result = {**result, "json": data, "summary": result_view.summarize(data)}
+    if cache_key:
+        with metrics.stage("serialize"):
+            result_cache.put(cache_key, result)
+    return result
+
+
+def finish_profileset_run(result: Dict, cache_key: Optional[str] = None, memo: Optional[Dict] = None) -> Dict:
+    """
+    memo: {"key": base key, "fields": {name: field}, "cached": [rows], "fresh": bool}
+    Store the freshly simmed rows in the profileset memo, report the baseline
+    shared by every run of this base (this run's, if it is the first or
+    "fresh"), merge the rows that were already memoized back in, and cache
+    the full result under `cache_key`.
+    """
+    if memo:
+        data = result.get("json") or {}
+        with metrics.stage("serialize"):
+            shared = result_cache.memo_store(memo["key"], memo["fields"], data, bool(memo.get("fresh")))
+        if shared is not None:
+            data = with_baseline(data, shared)
+        cached = [{**r, "cached": True} for r in memo.get("cached") or []]
+        result = {**result, "json": with_profileset_rows(data, profileset_rows(data) + cached)}
+    result = {**result, "summary": result_view.summarize(result.get("json") or {})}
+    if cache_key:
+        with metrics.stage("serialize"):
+            result_cache.put(cache_key, result)
+    return result
+
+
+def profileset_name(profile: Dict) -> str:
+    """Name a profileset def ends up with in the SimC input (and its results)."""
+    return profile.get("name", "noname").replace(".", "_")
+
+
+def generate_profilesets(base_profile: str, profiles: List[Dict]) -> str:
+    with metrics.stage("profileset_gen"):
+        lines = [base_profile.strip(), ""]
+        for p in profiles:
+            name = profileset_name(p)
+            overrides = p.get("overrides", [])
+            if not overrides:
+                continue
+            lines.append(f'profileset."{name}"={overrides[0]}')
+            for opt in overrides[1:]:
+                lines.append(f'profileset."{name}"+={opt}')
+        return "\n".join(lines) + "\n"
+
+
+def _bag_item_name(it: simc_export.Item) -> str:
+    item_id = it.item_id or "item"
+    return _sanitize_name(f"{it.slot}_{it.label or f'{it.slot}_{item_id}'}_{item_id}")
+
+
+def _equipped_item_name(it: simc_export.Item) -> str:
+    return _sanitize_name(f"{it.slot}_Equipped_{it.item_id or 'item'}")
+
+
+def extract_bag_overrides(simc_text: str, slots=("trinket1", "trinket2")):
+    """
+    Items of the '### Gear from Bags' section of a /simc export as
+    [{"name": str, "overrides": ["<slot>=,id=...,bonus_id=..."]}, ...]
+    Defaults to trinket1/trinket2.
+    """
+    return [{"name": _bag_item_name(it), "overrides": [it.override]}
+            for it in simc_export.parse(simc_text).bag_items(slots)]
 
 
 def extract_equipped_trinkets(simc_text: str, slots=("trinket1", "trinket2")):
     """Read the *equipped* trinkets from the top gear block (non-comment lines)."""
-    pat = re.compile(rf'^\s*(?P<slot>{"|".join(slots)})\s*=\s*(?P<rhs>,.*)$')
-    out = []
-    for line in simc_text.splitlines():
-        if line.lstrip().startswith("#"):  # skip comments
-            continue
-        m = pat.match(line)
-        if not m:
-            continue
-        slot, rhs = m.group("slot"), m.group("rhs")
-        override = f"{slot}={rhs}"  # keep exact format
-        mid = re.search(r"id=(\d+)", rhs)
-        item_id = mid.group(1) if mid else "item"
-        name = _sanitize_name(f"{slot}_Equipped_{item_id}")
-        out.append({"name": name, "overrides": [override], "source": "equipped"})
-    return out
+    return [{"name": _equipped_item_name(it), "overrides": [it.override], "source": "equipped"}
+            for it in simc_export.parse(simc_text).equipped_items(slots)]
 
 
 def extract_trinkets_all(simc_text: str, include_equipped: bool = True):
@@ -168,28 +402,18 @@ def extract_trinkets_all(simc_text: str, include_equipped: bool = True):
     Return a deduped list of trinkets from bags (+ equipped if requested)
     with a uniform shape for the UI/endpoint.
     """
-    bags = extract_bag_overrides(simc_text, ("trinket1", "trinket2"))
-    for b in bags:
-        b["source"] = "bags"
-
-    items = bags + (extract_equipped_trinkets(simc_text) if include_equipped else [])
+    model = simc_export.parse(simc_text)
+    slots = ("trinket1", "trinket2")
+    items = [(it, _bag_item_name(it)) for it in model.bag_items(slots)]
+    if include_equipped:
+        items += [(it, _equipped_item_name(it)) for it in model.equipped_items(slots)]
     out, seen = [], set()
-    for it in items:
-        ov = it["overrides"][0]
-        tail = trinket_tail_from_override(ov)  # used as dedupe key
-        if tail in seen:
+    for it, name in items:
+        if it.key in seen:  # same item in bags and equipped / both trinket slots
             continue
-        seen.add(tail)
-        slot = ov.split("=", 1)[0]
-        mid = re.search(r"id=(\d+)", ov)
-        item_id = int(mid.group(1)) if mid else None
-        out.append({
-            "name": it["name"],
-            "slot": slot,
-            "item_id": item_id,
-            "override": ov,
-            "source": it.get("source", "bags"),
-        })
+        seen.add(it.key)
+        out.append({"name": name, "slot": it.slot, "item_id": it.item_id, "override": it.override,
+                    "source": it.source})
     return out
 
 
@@ -199,27 +423,51 @@ def _id_from_tail(tail: str) -> Optional[int]:
     return int(m.group(1)) if m else None
 
 
-def _unique_map_for_ids(ids: List[int]) -> Dict[int, bool]:
-    """
-    Build {item_id: unique_equipped_bool} for the given IDs using item_parser.get_items_meta(),
-    if available. Otherwise returns {}.
-    """
+def _meta_map_for_ids(ids: List[int]) -> Dict[int, object]:
+    """{item_id: ItemMeta} for the given IDs via item_parser.get_items_meta(), if available; else {}."""
     if not ids or not get_items_meta:
         return {}
     try:
-        metas = get_items_meta(ids)  # synchronous helper you may add to item_parser
+        with metrics.stage("item_meta"):
+            metas = get_items_meta(ids)
     except Exception:
         return {}
-    out: Dict[int, bool] = {}
-    for m in metas:
-        out[getattr(m, "id", None)] = bool(getattr(m, "unique_equipped", False))
-    return {k: v for k, v in out.items() if isinstance(k, int)}
+    return {m.id: m for m in metas if isinstance(getattr(m, "id", None), int)}
+
+
+def _unique_map_for_ids(ids: List[int]) -> Dict[int, bool]:
+    """
+    Build {item_id: unique_equipped_bool} for the given IDs using item_parser.get_items_meta(),
+    if available. Otherwise returns {}.
+    """
+    return {i: _is_unique(m) for i, m in _meta_map_for_ids(ids).items()}
+
+
+def _is_unique(meta) -> bool:
+    return bool(getattr(meta, "unique_equipped", False))
+
+
+# Wowhead tooltips name the inventory type in a cell of their own; ranged
+# weapons (bows, guns, crossbows) take both hands as well
+_TWO_HAND = re.compile(r">\s*(Two-Hand|Ranged)\s*<", re.IGNORECASE)
+
+
+def _is_two_handed(meta) -> Optional[bool]:
+    """Whether an item takes both weapon slots, from its tooltip; None if there is no tooltip."""
+    tip = getattr(meta, "tooltip_html", None)
+    return bool(_TWO_HAND.search(tip)) if tip else None
 
 
 def make_trinket_pairs_profilesets(base_profile: str, items: list[dict]) -> str:
+    """Profileset input for every unique trinket pair (see make_trinket_pairs)."""
+    return generate_profilesets(base_profile, make_trinket_pairs(base_profile, items))
+
+
+def make_trinket_pairs(base_profile: str, items: list[dict]) -> List[Dict]:
     """
     items: [{"name": str, "override": "trinket1=,id=...", "item_id": int|None, "unique_equipped": bool|None}]
-    Build profilesets for every unique trinket pair, skipping:
+    Build profileset defs ({"name", "overrides"}, as used by generate_profilesets)
+    for every unique trinket pair, skipping:
       - the exact equipped pair (baseline already covers it)
       - duplicate 'same item id' pairs when that item is Unique-Equipped
     """
@@ -253,7 +501,7 @@ def make_trinket_pairs_profilesets(base_profile: str, items: list[dict]) -> str:
     t1, t2 = _equipped_trinket_tails(base_profile)
     equipped_pair = {t1, t2} if t1 and t2 else set()
 
-    lines = [base_profile.strip(), ""]
+    pairs: List[Dict] = []
     n = len(uniq)
     for i in range(n):
         for j in range(i + 1, n):
@@ -272,13 +520,12 @@ def make_trinket_pairs_profilesets(base_profile: str, items: list[dict]) -> str:
             ida = a["id"] or 0
             idb = b["id"] or 0
             pname = _sanitize_name(f"T_{ida}_VS_{idb}")
-            lines.append(f'profileset."{pname}"=trinket1={a["tail"]}')
-            lines.append(f'profileset."{pname}"+=trinket2={b["tail"]}')
+            pairs.append({"name": pname, "overrides": [f"trinket1={a['tail']}", f"trinket2={b['tail']}"]})
 
     # Fallback: if nothing got created, at least make singles
-    if len(lines) == 2:
+    if not pairs:
         for it in uniq:
             pname = _sanitize_name(f"T_{it['name']}")
-            lines.append(f'profileset."{pname}"=trinket1={it["tail"]}')
+            pairs.append({"name": pname, "overrides": [f"trinket1={it['tail']}"]})
 
-    return "\n".join(lines) + "\n"
+    return pairs
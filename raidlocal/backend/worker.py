@@ -0,0 +1,101 @@
+# backend/worker.py
+"""
+RQ workers that warm up once, before they fork any work horse:
+
+    rq worker -w backend.worker.WarmWorker simc_quick simc simc_bulk
+    rq worker-pool -w backend.worker.NodeWorker ...
+
+A plain `rq worker` imports nothing of ours, so every forked work horse
+imports the backend (FastAPI, pydantic, httpx: most of a second), probes the
+simc banner for cache keys and compiles regexes before the job starts, and
+throws all of it away afterwards. A warm worker does that in the parent:
+the horses inherit it, so a quick sim costs little more than simc itself.
+It also checks that SIMC_BIN really is simc and refuses to start otherwise.
+
+NodeWorker is a warm worker that also registers as a sim node (see
+backend/nodes.py), so it can run on any box that reaches the central Redis.
+"""
+from __future__ import annotations
+
+import gc
+import time
+from typing import Dict
+
+from rq import Worker
+
+# A tiny export, run through the parsers once to compile their patterns
+_SAMPLE = """warrior="Warmup"
+level=80
+spec=fury
+head=,id=1,bonus_id=1
+trinket1=,id=2,bonus_id=1
+trinket2=,id=3,bonus_id=1
+
+### Gear from Bags
+#
+# Bag Trinket (600)
+# trinket1=,id=4,bonus_id=1
+#
+"""
+
+
+def warm_up() -> Dict:
+    """Load what jobs use into this process; returns what was loaded (for the log)."""
+    t = time.perf_counter()
+
+    from . import (artifacts, cpu_budget, item_store, progress, report_reader, result_cache, result_view,
+                   scheduling, simc_export, simc_runner)
+
+    banner = simc_runner.verify_simc()
+    items = item_store.preload()
+
+    simc_export.parse(_SAMPLE)
+    simc_runner.extract_trinkets_all(_SAMPLE)
+    simc_runner.split_profilesets(_SAMPLE + 'profileset."a"=trinket1=,id=4\n', 2)
+    simc_runner.stage_one_args(["iterations=100"], 1.0)
+    progress.parse_progress("Profilesets (1/2): a [=====>......] 100/1000")
+    result_view.summarize(report_reader.slim({"sim": {"players": [{"name": "Warmup"}]}}))
+    result_cache.profileset_field(["trinket1=,id=4"])
+    scheduling.estimate_cost(_SAMPLE, ["iterations=100"])
+    cpu_budget.with_threads(["threads=2"], 1)
+    artifacts.url_for(None)
+    simc_export.parse.cache_clear()
+
+    # keep the warmed heap out of the collector's way, so horses don't
+    # copy its pages just by collecting
+    gc.collect()
+    gc.freeze()
+    return {"simc": banner, "items": items, "seconds": round(time.perf_counter() - t, 3)}
+
+
+class WarmWorker(Worker):
+    """rq Worker that runs warm_up() before it starts taking jobs."""
+
+    def warm_up(self) -> None:
+        info = warm_up()
+        self.log.info("Warmed up in %ss: %s, %d items preloaded", info["seconds"], info["simc"], info["items"])
+
+    def work(self, *args, **kwargs):
+        self.warm_up()
+        return super().work(*args, **kwargs)
+
+
+class NodeWorker(WarmWorker):
+    """WarmWorker that advertises itself as a sim node and heartbeats (see backend.nodes)."""
+
+    heartbeat = None
+
+    def warm_up(self) -> None:
+        from . import nodes
+
+        super().warm_up()
+        self.heartbeat = nodes.Heartbeat(self.name, self.queue_names())
+        self.heartbeat.start()
+        self.log.info("Registered as a worker of node %s (%d cores)", nodes.NODE_ID, self.heartbeat.info["cores"])
+
+    def work(self, *args, **kwargs):
+        try:
+            return super().work(*args, **kwargs)
+        finally:
+            if self.heartbeat is not None:
+                self.heartbeat.stop()
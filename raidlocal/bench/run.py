@@ -0,0 +1,294 @@
+# bench/run.py
+"""
+Benchmarks for the request and job pipeline. Run from the raidlocal
+directory:
+
+    python -m bench.run                      # everything, in-process fakeredis
+    python -m bench.run --only parse,pairs   # just some suites
+    python -m bench.run --redis redis://localhost:6379/15 --workers 4
+    python -m bench.run --out new.json --compare old.json
+
+Suites:
+  parse  extract_trinkets_all on synthetic exports (cold = fresh parse, warm = cached model)
+  pairs  make_trinket_pairs_profilesets at 10-60 items: time, profilesets, bytes
+  poll   /api/job latency (summary, full, status-only, view) for a 1,770-pair result
+  e2e    jobs/minute for quick sims + pair runs through the API against bench/stub_simc.py
+
+SimC is always the stub (SIMC_BIN is overridden) and the result cache is off,
+so every job really runs. With fakeredis the e2e suite uses one in-process
+worker; with a real Redis, --workers starts that many `rq worker --burst`
+processes (warm workers, as deployed). Reports are JSON; --compare prints the change per metric and exits
+non-zero past --threshold.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+STUB = os.path.join(HERE, "stub_simc.py")
+
+PAIR_SIZES = (10, 20, 30, 40, 50, 60)
+PARSE_SIZES = (20, 200, 2000)
+
+
+# ---- Helpers ----
+def synthetic_export(bag_trinkets: int, bag_other: int = 0) -> str:
+    """A /simc-style export with `bag_trinkets` trinkets (and other gear) in the bags."""
+    gear = ["head", "neck", "shoulder", "back", "chest", "wrist", "hands", "waist", "legs", "feet"]
+    lines = ['warrior="Bench"', "level=80", "race=orc", "region=eu", "server=bench", "role=attack",
+             "spec=fury", "talents=CgEAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAA", ""]
+    for i, slot in enumerate(gear):
+        lines += [f"# Equipped {slot} (639)", f"{slot}=,id={210000 + i},bonus_id=10356/1520,enchant_id=7000"]
+    lines += ["finger1=,id=211000,bonus_id=1", "finger2=,id=211001,bonus_id=1",
+              "# Equipped trinket (639)", "trinket1=,id=212000,bonus_id=10356",
+              "# Equipped trinket (639)", "trinket2=,id=212001,bonus_id=10356",
+              "main_hand=,id=213000,bonus_id=1", "", "### Gear from Bags", "#"]
+    for i in range(bag_trinkets):
+        lines += [f"# Bag Trinket {i} ({600 + i % 50})", f"# trinket1=,id={220000 + i},bonus_id=10356/{1500 + i % 40}", "#"]
+    for i in range(bag_other):
+        slot = gear[i % len(gear)]
+        lines += [f"# Bag {slot} {i} (610)", f"# {slot}=,id={230000 + i},bonus_id=1/2", "#"]
+    lines += ["### Additional Character Info", "#", "# checksum=deadbeef"]
+    return "\n".join(lines) + "\n"
+
+
+def timed(fn: Callable, repeat: int, setup: Optional[Callable] = None) -> List[float]:
+    out = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        t = time.perf_counter()
+        fn()
+        out.append(time.perf_counter() - t)
+    return out
+
+
+def latency(samples: List[float], **extra) -> Dict:
+    s = sorted(samples)
+    return {"unit": "ms", "better": "lower", "n": len(s),
+            "value": round(statistics.median(s) * 1e3, 4),
+            "mean": round(statistics.fmean(s) * 1e3, 4),
+            "p95": round(s[min(len(s) - 1, int(0.95 * len(s)))] * 1e3, 4),
+            "min": round(s[0] * 1e3, 4), **extra}
+
+
+# ---- Suites ----
+def bench_parse(repeat: int) -> Dict[str, Dict]:
+    from backend import simc_export, simc_runner
+
+    out = {}
+    for n in PARSE_SIZES:
+        text = synthetic_export(n, bag_other=n // 2)
+        cold = timed(lambda: simc_runner.extract_trinkets_all(text), repeat, setup=simc_export.parse.cache_clear)
+        simc_runner.extract_trinkets_all(text)
+        warm = timed(lambda: simc_runner.extract_trinkets_all(text), repeat)
+        out[f"parse.cold.{n}"] = latency(cold, export_bytes=len(text))
+        out[f"parse.warm.{n}"] = latency(warm, export_bytes=len(text))
+    return out
+
+
+def bench_pairs(repeat: int) -> Dict[str, Dict]:
+    from backend import simc_runner
+
+    text = synthetic_export(max(PAIR_SIZES))
+    items = simc_runner.extract_trinkets_all(text, include_equipped=False)
+    simc_runner.make_trinket_pairs_profilesets(text, items[:2])  # warm the item-meta loop
+    out = {}
+    for n in PAIR_SIZES:
+        sel = items[:n]
+        samples = timed(lambda: simc_runner.make_trinket_pairs_profilesets(text, sel), repeat)
+        generated = simc_runner.make_trinket_pairs_profilesets(text, sel)
+        out[f"pairs.{n}"] = latency(samples, profilesets=simc_runner.count_profilesets(generated),
+                                    output_bytes=len(generated.encode()))
+    return out
+
+
+def _client():
+    from fastapi.testclient import TestClient
+    from backend.app import app
+
+    return TestClient(app)
+
+
+def _pair_request(text: str, n: int, extra_args: List[str]) -> Dict:
+    from backend import simc_runner
+
+    items = simc_runner.extract_trinkets_all(text, include_equipped=False)[:n]
+    return {"base_profile": text, "items": [{"name": i["name"], "override": i["override"]} for i in items],
+            "extra_args": extra_args, "no_cache": True}
+
+
+def _drain(workers: int, redis_url: str) -> None:
+    """Run queued jobs to completion: in-process for fakeredis, else `rq worker --burst` processes."""
+    from backend import scheduling
+    from backend.queue_utils import FAKE_URL, get_queue, get_redis
+
+    if redis_url.startswith(FAKE_URL):
+        from rq import SimpleWorker
+        SimpleWorker([get_queue(q) for q in scheduling.QUEUES], connection=get_redis()).work(
+            burst=True, logging_level="WARNING")
+        return
+    procs = [subprocess.Popen(["rq", "worker", "--burst", "-w", "backend.worker.WarmWorker", "-u", redis_url,
+                               *scheduling.QUEUES], cwd=ROOT,
+                              env=os.environ.copy(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+             for _ in range(max(1, workers))]
+    for p in procs:
+        p.wait()
+
+
+def bench_poll(repeat: int, redis_url: str, workers: int) -> Dict[str, Dict]:
+    client = _client()
+    text = synthetic_export(60)
+    os.environ["STUB_SIMC_PROFILESET_DELAY"] = "0"
+    job_id = client.post("/api/top-gear-trinket-pairs", json=_pair_request(text, 60, ["iterations=100"])).json()["job_id"]
+    _drain(workers, redis_url)
+    first = client.get(f"/api/job/{job_id}").json()
+    if first.get("status") != "finished":
+        raise RuntimeError(f"poll setup job did not finish: {first}")
+    rows = len(first["result"]["summary"]["profilesets"]["name"])
+    out = {}
+    for key, url in (("summary", f"/api/job/{job_id}"), ("full", f"/api/job/{job_id}?full=true"),
+                     ("status", f"/api/job/{job_id}/status"), ("view_top20", f"/api/job/{job_id}/view?top=20")):
+        size = len(client.get(url).content)
+        out[f"poll.{key}"] = latency(timed(lambda: client.get(url), repeat), rows=rows, response_bytes=size)
+    return out
+
+
+def bench_e2e(quick: int, pair_jobs: int, pair_items: int, redis_url: str, workers: int) -> Dict[str, Dict]:
+    from rq.job import Job
+    from backend import simc_runner
+    from backend.queue_utils import get_redis
+
+    client = _client()
+    # first-call costs (banner probe, item-meta loop, app startup) are not submit time
+    simc_runner.simc_version()
+    text = synthetic_export(pair_items)
+    simc_runner.make_trinket_pairs(text, simc_runner.extract_trinkets_all(text)[:2])
+    client.get("/healthz")
+    ids = []
+    t0 = time.perf_counter()
+    for i in range(quick):
+        body = {"simc_input": synthetic_export(0) + f"name=Bench{i}\n", "extra_args": ["iterations=1000"], "no_cache": True}
+        ids.append(client.post("/api/quick-sim", json=body).json()["job_id"])
+    for i in range(pair_jobs):
+        text = synthetic_export(pair_items) + f"name=Pairs{i}\n"
+        ids.append(client.post("/api/top-gear-trinket-pairs", json=_pair_request(text, pair_items, ["iterations=1000"])).json()["job_id"])
+    submitted = time.perf_counter() - t0
+    t1 = time.perf_counter()
+    _drain(workers, redis_url)
+    elapsed = time.perf_counter() - t1
+
+    jobs = [j for j in Job.fetch_many(ids, connection=get_redis()) if j is not None]
+    done = [j for j in jobs if j.is_finished]
+    turnaround = [(j.ended_at - j.enqueued_at).total_seconds() for j in done if j.ended_at and j.enqueued_at]
+    total = quick + pair_jobs
+    return {
+        "e2e.jobs_per_min": {"unit": "jobs/min", "better": "higher", "value": round(len(done) / elapsed * 60, 2),
+                             "jobs": total, "finished": len(done), "elapsed_s": round(elapsed, 3),
+                             "workers": workers, "stub_delay_s": float(os.environ.get("STUB_SIMC_DELAY", "0.5"))},
+        "e2e.submit_per_job": {"unit": "ms", "better": "lower", "value": round(submitted / max(1, total) * 1e3, 4)},
+        "e2e.turnaround": latency(turnaround or [0.0]),
+    }
+
+
+# ---- Reports ----
+def _meta(args) -> Dict:
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except Exception:
+        rev = ""
+    return {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "git": rev, "python": platform.python_version(),
+            "platform": platform.platform(), "cpus": os.cpu_count(), "redis": args.redis,
+            "workers": args.workers, "repeat": args.repeat, "stub_delay_s": args.stub_delay}
+
+
+def compare(old: Dict, new: Dict, threshold: float) -> List[str]:
+    """Per-metric change lines; regressions past `threshold` % are marked."""
+    lines, worse = [], 0
+    for key, cur in new["results"].items():
+        prev = old.get("results", {}).get(key)
+        if not prev or not prev.get("value"):
+            continue
+        pct = (cur["value"] / prev["value"] - 1) * 100
+        bad = pct > threshold if cur.get("better") == "lower" else pct < -threshold
+        worse += bad
+        lines.append(f"{key:<24} {prev['value']:>12.3f} -> {cur['value']:>12.3f} {cur['unit']:<8} {pct:+7.1f}%"
+                     + ("  REGRESSION" if bad else ""))
+    lines.append(f"{worse} regression(s) past {threshold:g}%")
+    return lines
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m bench.run", description=__doc__.split("\n\n")[0])
+    ap.add_argument("--only", default="parse,pairs,poll,e2e", help="comma-separated suites")
+    ap.add_argument("--redis", default=os.environ.get("BENCH_REDIS_URL", "fakeredis://"),
+                    help="fakeredis:// (default) or a Redis URL; use a scratch db, it gets flushed")
+    ap.add_argument("--workers", type=int, default=1, help="rq workers for e2e/poll (real Redis only)")
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--stub-delay", type=float, default=0.2, help="seconds the stub simc takes per run")
+    ap.add_argument("--quick-jobs", type=int, default=20)
+    ap.add_argument("--pair-jobs", type=int, default=4)
+    ap.add_argument("--pair-items", type=int, default=12)
+    ap.add_argument("--out", help="write the JSON report here")
+    ap.add_argument("--compare", help="previous JSON report to compare against")
+    ap.add_argument("--threshold", type=float, default=10.0, help="regression threshold in %%")
+    args = ap.parse_args(argv)
+    if args.redis.startswith("fakeredis://"):
+        args.workers = 1
+
+    # configure before the backend is imported (settings are read at import time)
+    os.chdir(ROOT)
+    sys.path.insert(0, ROOT)
+    os.environ.update({
+        "REDIS_URL": args.redis, "SIMC_BIN": STUB, "SIMC_CACHE": "0", "ITEM_FETCH_REMOTE": "0",
+        "ITEM_DB_PATH": os.path.join(tempfile.gettempdir(), "raidlocal-bench-noitems.sqlite"),
+        "SIMC_ARTIFACT_DIR": tempfile.mkdtemp(prefix="raidlocal-bench-"),
+        "STUB_SIMC_DELAY": str(args.stub_delay), "STUB_SIMC_HTML_KB": os.environ.get("STUB_SIMC_HTML_KB", "256"),
+    })
+    from backend.queue_utils import get_redis
+    get_redis().flushdb()
+
+    suites = [s.strip() for s in args.only.split(",") if s.strip()]
+    results: Dict[str, Dict] = {}
+    for s in suites:
+        t = time.perf_counter()
+        if s == "parse":
+            results.update(bench_parse(args.repeat))
+        elif s == "pairs":
+            results.update(bench_pairs(max(3, args.repeat // 4)))
+        elif s == "poll":
+            results.update(bench_poll(args.repeat, args.redis, args.workers))
+        elif s == "e2e":
+            os.environ["STUB_SIMC_PROFILESET_DELAY"] = "0.005"
+            results.update(bench_e2e(args.quick_jobs, args.pair_jobs, args.pair_items, args.redis, args.workers))
+        else:
+            ap.error(f"unknown suite {s!r}")
+        print(f"[{s}] done in {time.perf_counter() - t:.1f}s", file=sys.stderr)
+
+    report = {"meta": _meta(args), "results": results}
+    for key, r in results.items():
+        extra = ", ".join(f"{k}={v}" for k, v in r.items() if k not in ("unit", "better", "value", "n"))
+        print(f"{key:<24} {r['value']:>12.3f} {r['unit']:<8} {extra}")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            lines = compare(json.load(f), report, args.threshold)
+        print("\n".join(lines))
+        return 1 if not lines[-1].startswith("0 ") else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
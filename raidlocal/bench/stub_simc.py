@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Stand-in for the simc binary (point SIMC_BIN at this file). It accepts the
+same command line the runner builds, prints SimC-style progress, waits a
+configurable time and writes a canned json2/html report with one
+deterministic result per profileset.
+
+    STUB_SIMC_DELAY           seconds per run (default 0.5)
+    STUB_SIMC_PROFILESET_DELAY  extra seconds per profileset (default 0.01)
+    STUB_SIMC_HTML_KB         size of the html report (default 256)
+"""
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+
+BANNER = "SimulationCraft 1100-01 for World of Warcraft 11.1.0 Live (stub)"
+_PROFILESET = re.compile(r'^\s*profileset\."(?P<name>[^"]+)"\+?=')
+
+
+def _arg(args, key):
+    for a in args:
+        if a.startswith(key + "="):
+            return a.split("=", 1)[1]
+    return None
+
+
+def _score(name: str) -> float:
+    # stable pseudo-random spread of +-3% around the baseline
+    h = int(hashlib.sha1(name.encode()).hexdigest()[:8], 16)
+    return (h / 0xFFFFFFFF - 0.5) * 0.06
+
+
+def main(argv):
+    if not argv:
+        print(BANNER)
+        return 0
+    with open(argv[0], "r", encoding="utf-8") as f:
+        text = f.read()
+    names = list(dict.fromkeys(m.group("name") for m in map(_PROFILESET.match, text.splitlines()) if m))
+    actor = next((l.split("=", 1)[1].strip('"') for l in text.splitlines()
+                  if re.match(r"^\s*(warrior|paladin|hunter|rogue|priest|deathknight|shaman|mage|warlock|monk|druid"
+                              r"|demonhunter|evoker)\s*=", l)), "Stub")
+    iterations = int(_arg(argv, "iterations") or 1000)
+    delay = float(os.environ.get("STUB_SIMC_DELAY", "0.5"))
+    per_ps = float(os.environ.get("STUB_SIMC_PROFILESET_DELAY", "0.01"))
+
+    started = time.monotonic()
+    print(BANNER, flush=True)
+    steps = 4
+    for i in range(1, steps + 1):
+        time.sleep(delay / steps)
+        bar = "=" * (i * 5) + ">"
+        print(f"Generating Baseline: {actor} [{bar:<21}] {iterations * i // steps}/{iterations}", flush=True)
+    for k, name in enumerate(names, 1):
+        time.sleep(per_ps)
+        print(f"Profilesets ({k}/{len(names)}): {name} [{'=' * 20}>] {iterations}/{iterations}", flush=True)
+
+    base = 1_000_000.0
+    report = {
+        "version": "1100-01",
+        "sim": {
+            "statistics": {"total_iterations": iterations,
+                           "elapsed_time_seconds": round(time.monotonic() - started, 3)},
+            "players": [{"name": actor, "collected_data": {"dps": {"mean": base, "mean_std_dev": 150.0,
+                                                                    "count": iterations}}}],
+            "profilesets": {"metric": "dps", "results": [
+                {"name": n, "mean": round(base * (1 + _score(n)), 1), "mean_error": 300.0, "mean_stddev": 150.0,
+                 "iterations": iterations} for n in names
+            ]},
+        },
+    }
+    json_path, html_path = _arg(argv, "json2"), _arg(argv, "html")
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f)
+    if html_path:
+        kb = int(os.environ.get("STUB_SIMC_HTML_KB", "256"))
+        with open(html_path, "w", encoding="utf-8") as f:
+            f.write("<html><body><h1>stub report</h1>")
+            f.write(("<p>" + "x" * 1018 + "</p>\n") * kb)
+            f.write("</body></html>")
+    print("Simulation complete.", flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
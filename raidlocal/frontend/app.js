@@ -254,6 +254,10 @@ function collectSimcOptions(){
   return opts;
 }
 
+function noCache(){
+  return !!document.getElementById("noCache")?.checked;
+}
+
 // ---------- formatting ----------
 function fmtInt(n){ return Math.round(n).toLocaleString(); }
 function fmtDps(n){
@@ -466,6 +470,7 @@ function buildTopGearTable(resultJson){
     return {
       name,
       dps: (typeof dps === "number" ? dps : null),
+      stage: p.stage ?? null,
       items: partsFromProfilesetName(name),
       isEquipped: isEquippedPairName(name)
     };
@@ -554,6 +559,9 @@ function buildTopGearTable(resultJson){
     const tag = row.isTop
       ? `<span class="badge-top">Top Gear</span>`
       : (row.isEquipped ? `<span class="badge-eq">Equipped</span>` : "");
+    const est = row.stage === 1
+      ? ` <span class="badge" title="Low-precision estimate — pruned after the first stage">est.</span>`
+      : "";
 
     const dpsCell = fmtDps(row.dps);
 
@@ -576,7 +584,7 @@ function buildTopGearTable(resultJson){
         <div class="tg-icon">${A.item_id?`<img class="tg-item-icon" data-item-id="${A.item_id}" src="${iconForItem(A.item_id)}" alt="" title="${titleA}">`:``}</div>
         <div class="tg-icon">${B.item_id?`<img class="tg-item-icon" data-item-id="${B.item_id}" src="${iconForItem(B.item_id)}" alt="" title="${titleB}">`:``}</div>
         <div class="tg-name" title="${label.replace(/"/g,'&quot;')}">
-          ${label} ${tag}
+          ${label} ${tag}${est}
         </div>
         <div class="tg-dps">${dpsCell}${bar(row.dps)}</div>
         <div class="tg-delta ${dCls}">${deltaCell}</div>
@@ -610,6 +618,84 @@ function attachTopGearControls(){
 // =====================================================
 // ===================  Run sims  ======================
 // =====================================================
+const JOB_DONE = ["finished", "failed", "stopped", "canceled", "missing"];
+
+// Wait for a job to end; calls onEvent for every status/progress/rows event.
+// Uses the server-sent event stream, falling back to polling.
+function waitForJob(job_id, onEvent){
+  for (const k in __progressBySource) delete __progressBySource[k];
+  const fetchJob = async ()=> (await fetch(`/api/job/${job_id}`)).json();
+  // polling reads the status alone; the result is fetched once at the end
+  const poll = async ()=>{
+    for(;;){
+      const st = await (await fetch(`/api/job/${job_id}/status`)).json();
+      onEvent({ type: "status", status: st.status });
+      if (!st.status || JOB_DONE.includes(st.status)) return fetchJob();
+      await new Promise(r=>setTimeout(r,1500));
+    }
+  };
+  if (!window.EventSource) return poll();
+  return new Promise(resolve => {
+    const es = new EventSource(`/api/job/${job_id}/events`);
+    let done = false;
+    es.onmessage = (e)=>{
+      const ev = JSON.parse(e.data);
+      onEvent(ev);
+      if (ev.type === "status" && JOB_DONE.includes(ev.status)){
+        done = true;
+        es.close();
+        fetchJob().then(resolve);
+      }
+    };
+    es.onerror = ()=>{
+      if (done) return;
+      done = true;
+      es.close();
+      poll().then(resolve);
+    };
+  });
+}
+
+// Show `btnId` while `promise` runs; clicking it cancels the job (and kills its simc)
+async function withCancel(btnId, job_id, promise){
+  const btn = document.getElementById(btnId);
+  if (!btn) return promise;
+  btn.hidden = false;
+  btn.disabled = false;
+  btn.onclick = async ()=>{
+    btn.disabled = true;
+    try{ await fetch(`/api/job/${job_id}/cancel`, { method: "POST" }); }catch{ /* the status stream reports it */ }
+  };
+  try{ return await promise; }
+  finally{ btn.hidden = true; btn.onclick = null; }
+}
+
+// Status text right after submitting: the server's runtime estimate and queue wait
+function fmtSecs(s){
+  s = Math.round(s || 0);
+  return s >= 60 ? `${Math.floor(s / 60)}m ${s % 60}s` : `${s}s`;
+}
+function estimateLine(sub){
+  const e = sub?.estimate;
+  if (!e) return "";
+  const wait = e.queue_eta_seconds >= 1 ? `, starts in ~${fmtSecs(e.queue_eta_seconds)}` : "";
+  return `Queued: ~${fmtSecs(e.seconds)} to sim${wait}` + (sub.downgraded ? ` (${sub.downgraded})` : "");
+}
+
+// Status text for a job event; sharded runs report per shard (ev.source)
+const __progressBySource = {};
+function statusLine(ev){
+  if (ev.type === "status") return `Status: ${ev.status}`;
+  if (ev.type !== "progress") return null;
+  __progressBySource[ev.source || "job"] = ev.pct || 0;
+  const vals = Object.values(__progressBySource);
+  const pct = vals.reduce((a,b)=>a+b, 0) / vals.length;
+  const what = ev.phase === "profilesets"
+    ? `profileset ${ev.profileset}/${ev.profilesets}`
+    : ev.phase;
+  return `Simulating: ${what} • ${pct.toFixed(0)}%` + (vals.length > 1 ? ` (${vals.length} shards)` : "");
+}
+
 async function runQuickSim(){
   const st = document.getElementById("quickSimStatus");
   const out = document.getElementById("quickSimResult");
@@ -619,20 +705,19 @@ async function runQuickSim(){
   if(!simc){ st.textContent = "Paste SimC input first."; return; }
   st.textContent = st.textContent || "Submitting...";
   out.textContent = "";
-  const { job_id } = await postJSON("/api/quick-sim", { simc_input: simc, extra_args: extraArgs });
-  for(;;){
-    const jr = await (await fetch(`/api/job/${job_id}`)).json();
-    st.textContent = `Status: ${jr.status}`;
-    if(jr.status === "finished"){
-      const dps = jr.result?.json?.sim?.players?.[0]?.collected_data?.dps?.mean;
-      out.textContent = dps ? `DPS: ${fmtInt(dps)}` : JSON.stringify(jr.result?.json || {});
-      break;
-    }
-    if(jr.status === "failed"){
-      out.textContent = jr.error || "Job failed";
-      break;
-    }
-    await new Promise(r=>setTimeout(r,1500));
+  const sub = await postJSON("/api/quick-sim", { simc_input: simc, extra_args: extraArgs, no_cache: noCache() });
+  const { job_id } = sub;
+  st.textContent = estimateLine(sub) || st.textContent;
+  const jr = await withCancel("quickSimCancel", job_id, waitForJob(job_id, ev => {
+    const msg = statusLine(ev);
+    if (msg) st.textContent = msg;
+  }));
+  if(jr.status === "finished"){
+    st.textContent = "Status: finished";
+    const dps = jr.result?.summary?.baseline?.dps;
+    out.textContent = dps ? `DPS: ${fmtInt(dps)}` : JSON.stringify(jr.result?.summary || {});
+  } else {
+    out.textContent = jr.error || jr.detail || `Job ${jr.status || "failed"}`;
   }
 }
 
@@ -663,49 +748,59 @@ async function runPairs(items){
   st.textContent = st.textContent || "Submitting...";
   out.innerHTML = "";
 
-  const { job_id } = await postJSON("/api/top-gear-trinket-pairs", {
+  const sub = await postJSON("/api/top-gear-trinket-pairs", {
     base_profile: base,
     items,
-    extra_args: extraArgs
+    extra_args: extraArgs,
+    no_cache: noCache(),
+    staged: !!document.getElementById("tgStaged")?.checked
   });
-
-  for(;;){
-    const jr = await (await fetch(`/api/job/${job_id}`)).json();
-    st.textContent = `Status: ${jr.status}`;
-
-    if(jr.status === "finished"){
-      window.__tgLast = jr.result?.json || {};
-
-      let htmlLink = "";
-      if(jr.result?.html_base64){
-        const blob = new Blob([atob(jr.result.html_base64)], { type: "text/html" });
-        const url = URL.createObjectURL(blob);
-        htmlLink = `<div style="padding:8px 0">
-          <a class="button" href="${url}" target="_blank" rel="noopener">Open HTML Report</a>
-        </div>`;
-      }
-
-      // ensure icons are ready for whatever pairs came out on top
-      await warmItemMetaFromTrinkets(window.__tgTrinkets || []);
-      // Also warm by scanning ids that appear only in the profileset names
-      const idsAll = new Set([
-        ...(idsFromResultJson(window.__tgLast) || []),
-        ...((window.__tgTrinkets || []).map(t => t.item_id).filter(Boolean))
-      ]);
-      await warmItemMetaFromIds([...idsAll]);
-
-      set("tgResult", htmlLink + buildTopGearTable(window.__tgLast));
-      attachItemTooltips();
-      attachTopGearControls();
-      break;
+  const { job_id } = sub;
+  st.textContent = estimateLine(sub) || st.textContent;
+
+  // Partial table from rows streamed while the sim runs
+  const partial = [];
+  const jr = await withCancel("tgCancel", job_id, waitForJob(job_id, ev => {
+    const msg = statusLine(ev);
+    if (msg) st.textContent = msg;
+    if (ev.type === "rows" && ev.rows?.length){
+      partial.push(...ev.rows);
+      set("tgResult", buildTopGearTable({ sim: { profilesets: { results: partial } } }));
     }
+  }));
+  st.textContent = `Status: ${jr.status || "failed"}`;
+
+  if(jr.status === "finished"){
+    // ranked server-side; reshape into the json2 layout the table reads
+    const v = await (await fetch(`/api/job/${job_id}/view`)).json();
+    window.__tgLast = {
+      sim: {
+        players: [{ collected_data: { dps: { mean: v.baseline?.dps } } }],
+        profilesets: { results: (v.rows || []).map(r => ({ name: r.name, mean: r.mean, mean_error: r.error, stage: r.stage, cached: r.cached })) }
+      }
+    };
 
-    if(jr.status === "failed"){
-      out.textContent = jr.error || "Job failed";
-      break;
+    let htmlLink = "";
+    if(jr.result?.html_url){
+      htmlLink = `<div style="padding:8px 0">
+        <a class="button" href="${jr.result.html_url}" target="_blank" rel="noopener">Open HTML Report</a>
+      </div>`;
     }
 
-    await new Promise(r => setTimeout(r, 1500));
+    // ensure icons are ready for whatever pairs came out on top
+    await warmItemMetaFromTrinkets(window.__tgTrinkets || []);
+    // Also warm by scanning ids that appear only in the profileset names
+    const idsAll = new Set([
+      ...(idsFromResultJson(window.__tgLast) || []),
+      ...((window.__tgTrinkets || []).map(t => t.item_id).filter(Boolean))
+    ]);
+    await warmItemMetaFromIds([...idsAll]);
+
+    set("tgResult", htmlLink + buildTopGearTable(window.__tgLast));
+    attachItemTooltips();
+    attachTopGearControls();
+  } else {
+    out.textContent = jr.error || jr.detail || `Job ${jr.status || "failed"}`;
   }
 }
 document.getElementById("runQuickSim").onclick = runQuickSim;